@@ -0,0 +1,136 @@
+"""
+ Générateur de chiffriers de rétroaction synthétiques pour les bancs d'essai.
+
+ python benchmarks/generer_chiffrier.py -o <fichier> -e <eleves> -c <criteres>
+                                        -t <proportion_texte> -l <longueur_commentaire>
+"""
+import getopt
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import openpyxl # type: ignore # pylint: disable=wrong-import-position
+
+import retroaction # pylint: disable=wrong-import-position
+
+NOM_FEUILLE = "Rétroaction"
+MOTS = (
+    "travail", "bien", "structure", "code", "**attention**", "à", "la", "remise",
+    "tests", "manquants", "variables", "claires", "revoir", "la", "logique", "de",
+    "boucle", "bravo", "commentaires", "pertinents", "--détails--", "erreur",
+    )
+
+
+def texte_aleatoire(generateur, longueur):
+    """
+        Créer un texte d'environ longueur caractères.
+
+        Paramètres
+        ----------
+        generateur : random.Random
+            Générateur de nombres aléatoires
+        longueur : int
+            Longueur approximative du texte
+    """
+    mots = []
+    taille = 0
+    while taille < longueur:
+        mot = generateur.choice(MOTS)
+        mots.append(mot)
+        taille += len(mot) + 1
+    return " ".join(mots)
+
+
+def generer_chiffrier(fichier_sortie,
+                      nombre_eleves=30,
+                      nombre_criteres=20,
+                      proportion_texte=0.1,
+                      longueur_commentaire=200,
+                      graine=0):
+    """
+        Écrire un chiffrier de rétroaction réaliste.
+
+        Paramètres
+        ----------
+        fichier_sortie : str
+            Chemin du chiffrier Excel à créer
+        nombre_eleves : int
+            Nombre d'élèves (une colonne par élève)
+        nombre_criteres : int
+            Nombre de critères de correction (une ligne par critère)
+        proportion_texte : float
+            Proportion des critères qui sont des commentaires {texte}
+        longueur_commentaire : int
+            Longueur approximative des commentaires, en caractères
+        graine : int
+            Graine du générateur aléatoire, pour des chiffriers reproductibles
+
+        Retour
+        ------
+        Le nom de la feuille créée.
+    """
+    generateur = random.Random(graine)
+
+    chiffrier = openpyxl.Workbook(write_only=True)
+    feuille = chiffrier.create_sheet(NOM_FEUILLE)
+
+    colonnes = range(nombre_eleves)
+    feuille.append([retroaction.LIBELLE_DA] + [str(1000000 + eleve) for eleve in colonnes])
+    feuille.append([retroaction.LIBELLE_NOM] + [f"Nom{eleve}" for eleve in colonnes])
+    feuille.append([retroaction.LIBELLE_PRENOM] + [f"Prénom{eleve}" for eleve in colonnes])
+    feuille.append([retroaction.LIBELLE_NOTES] +
+                   [generateur.randint(0, nombre_criteres) for _ in colonnes])
+    feuille.append([retroaction.LIBELLE_SELECTION] +
+                   [generateur.choice(("X", None)) for _ in colonnes])
+    feuille.append([retroaction.LIBELLE_COMMENTAIRES] +
+                   [texte_aleatoire(generateur, longueur_commentaire) for _ in colonnes])
+    feuille.append([None])
+
+    for critere in range(nombre_criteres):
+        if generateur.random() < proportion_texte:
+            feuille.append([f"Commentaire {critere} {{texte}}"] +
+                           [texte_aleatoire(generateur, longueur_commentaire) for _ in colonnes])
+        else:
+            titre = f"Critère {critere} : " + texte_aleatoire(generateur, generateur.randint(10, 120))
+            feuille.append([titre] + [generateur.choice(("X", None, 1, 0.5)) for _ in colonnes])
+
+    chiffrier.save(fichier_sortie)
+    return NOM_FEUILLE
+
+
+def main(argv):
+    """
+        Procédure principale
+    """
+    fichier_sortie = "synthetique.xlsx"
+    nombre_eleves = 30
+    nombre_criteres = 20
+    proportion_texte = 0.1
+    longueur_commentaire = 200
+
+    try:
+        opts, _ = getopt.getopt(argv, "o:e:c:t:l:")
+    except getopt.GetoptError:
+        print(__doc__)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-o':
+            fichier_sortie = arg
+        elif opt == '-e':
+            nombre_eleves = int(arg)
+        elif opt == '-c':
+            nombre_criteres = int(arg)
+        elif opt == '-t':
+            proportion_texte = float(arg)
+        elif opt == '-l':
+            longueur_commentaire = int(arg)
+
+    nom_feuille = generer_chiffrier(fichier_sortie, nombre_eleves, nombre_criteres,
+                                    proportion_texte, longueur_commentaire)
+    print(f'Feuille "{nom_feuille}" écrite dans {fichier_sortie}')
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
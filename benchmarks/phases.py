@@ -0,0 +1,111 @@
+"""
+ Banc d'essai de chaque phase du générateur de rétroaction, à plusieurs échelles.
+
+ python benchmarks/phases.py [eleves x criteres ...]
+
+ Exemple : python benchmarks/phases.py 30x20 150x40 500x80
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from zipfile import ZipFile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import retroaction # pylint: disable=wrong-import-position
+from generer_chiffrier import generer_chiffrier # pylint: disable=wrong-import-position
+
+ECHELLES = ((30, 20), (150, 40), (500, 80))
+
+
+def chronometrer(fonction, *arguments):
+    """
+        Exécuter une fonction en silence et renvoyer son résultat et sa durée.
+
+        Paramètres
+        ----------
+        fonction : callable
+            La fonction à chronométrer
+        arguments :
+            Les arguments de la fonction
+    """
+    debut = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultat = fonction(*arguments)
+    return resultat, time.perf_counter() - debut
+
+
+def mesurer_echelle(dossier, nombre_eleves, nombre_criteres):
+    """
+        Mesurer la durée de chaque phase pour un chiffrier de la taille donnée.
+
+        Paramètres
+        ----------
+        dossier : str
+            Dossier de travail temporaire
+        nombre_eleves : int
+            Nombre d'élèves du chiffrier
+        nombre_criteres : int
+            Nombre de critères du chiffrier
+
+        Retour
+        ------
+        Un dictionnaire phase -> durée en secondes.
+    """
+    fichier = os.path.join(dossier, f"{nombre_eleves}x{nombre_criteres}.xlsx")
+    nom_feuille = generer_chiffrier(fichier, nombre_eleves, nombre_criteres)
+    dossier_sortie = os.path.join(dossier, f"sortie_{nombre_eleves}x{nombre_criteres}")
+    os.makedirs(dossier_sortie, exist_ok=True)
+
+    durees = {}
+    (feuille, criteres), durees["validation"] = chronometrer(
+        retroaction.valider_parametres, fichier, dossier_sortie, nom_feuille, nombre_criteres)
+    eleves, durees["generer_liste_eleves"] = chronometrer(
+        retroaction.generer_liste_eleves, feuille, nombre_criteres, False, criteres)
+
+    contenus = []
+    debut = time.perf_counter()
+    for eleve in eleves:
+        contenus.append(retroaction.traiter_eleve(dossier_sortie, eleve, nom_feuille, False))
+    durees["traiter_eleve"] = time.perf_counter() - debut
+    durees["traiter_eleve / élève"] = durees["traiter_eleve"] / len(eleves)
+
+    # Les PDF sont compressés par les processus de travail, puis ajoutés tels quels
+    methode = retroaction.COMPRESSION_ZIP[0]
+    debut = time.perf_counter()
+    membres = [retroaction.compresser_membre(contenu, retroaction.COMPRESSION_ZIP)
+               for contenu in contenus]
+    durees["compression"] = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    with ZipFile(os.path.join(dossier_sortie, "travaux.zip"), "w") as fichier_zip:
+        for eleve, membre in zip(eleves, membres):
+            retroaction.ajouter_membre(fichier_zip, eleve.nom_pdf(), membre, methode)
+    durees["écriture zip"] = time.perf_counter() - debut
+
+    _, durees["sommaire_notes"] = chronometrer(
+        retroaction.sommaire_notes, eleves, dossier_sortie, nombre_criteres, nom_feuille)
+
+    return durees
+
+
+def main(argv):
+    """
+        Procédure principale
+    """
+    echelles = [tuple(int(n) for n in echelle.split("x")) for echelle in argv] or ECHELLES
+
+    with tempfile.TemporaryDirectory() as dossier:
+        for nombre_eleves, nombre_criteres in echelles:
+            durees = mesurer_echelle(dossier, nombre_eleves, nombre_criteres)
+            print(f"{nombre_eleves} élève(s) x {nombre_criteres} critère(s)")
+            for phase, duree in durees.items():
+                print(f"    {phase:<24} {duree * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,75 @@
+"""
+ Banc d'essai du coût par élève avec et sans le cache des polices TrueType.
+
+ python benchmarks/polices.py [nombre_eleves]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import retroaction # pylint: disable=wrong-import-position
+
+
+def creer_eleve(numero):
+    """
+        Créer un élève fictif avec une grille de correction typique.
+
+        Paramètres
+        ----------
+        numero : int
+            Numéro de l'élève, utilisé pour son DA
+    """
+    eleve = retroaction.Eleve(str(1000000 + numero), "Prénom", "Nom", 15)
+    eleve.denominateur = 20
+    eleve.commentaires = "Beau travail, **bravo**!"
+    for critere in range(20):
+        eleve.ajout_note(f"Critère {critere}", "X" if critere % 2 else 1)
+    return eleve
+
+
+def mesurer(eleves, dossier_sortie, vider_cache):
+    """
+        Mesurer le temps moyen de création d'un PDF, en secondes.
+
+        Paramètres
+        ----------
+        eleves : list
+            La liste des élèves à traiter
+        dossier_sortie : str
+            Chemin du dossier qui recevra les fichiers PDF
+        vider_cache : bool
+            True pour analyser les polices à chaque élève (comportement sans cache)
+    """
+    debut = time.perf_counter()
+    for eleve in eleves:
+        if vider_cache:
+            retroaction.CACHE_POLICES.clear()
+        retroaction.traiter_eleve(dossier_sortie, eleve, "Banc d'essai")
+    return (time.perf_counter() - debut) / len(eleves)
+
+
+def main(argv):
+    """
+        Procédure principale
+    """
+    nombre_eleves = int(argv[0]) if argv else 50
+    eleves = [creer_eleve(numero) for numero in range(nombre_eleves)]
+
+    with tempfile.TemporaryDirectory() as dossier_sortie:
+        # Réchauffer les imports et le cache disque
+        mesurer(eleves[:1], dossier_sortie, True)
+
+        avant = mesurer(eleves, dossier_sortie, True)
+        apres = mesurer(eleves, dossier_sortie, False)
+
+    print(f"{nombre_eleves} élève(s)")
+    print(f"Sans cache des polices : {avant * 1000:.1f} ms / élève")
+    print(f"Avec cache des polices : {apres * 1000:.1f} ms / élève")
+    print(f"Gain : {(avant - apres) / avant * 100:.0f} %")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -2,12 +2,44 @@
 """
 Création d'un chiffrier d'horaire pour PowerAutomate.
 """
+import csv
 import getopt
+import hashlib
+import io
 import os
+import re
 import datetime
 import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 from zipfile import BadZipFile
 import openpyxl # type: ignore
+from openpyxl.utils import get_column_letter # type: ignore
+from openpyxl.utils.exceptions import InvalidFileException # type: ignore
+from openpyxl.worksheet.filters import AutoFilter # type: ignore
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo # type: ignore
+
+# Les cours qui commencent avant midi ont lieu le matin (AM)
+MIDI = datetime.time(12, 0, 0)
+
+# Colonnes de la table Horaires attendues par PowerAutomate
+ENTETES_HORAIRE = ("Sujet", "Date début", "Date fin", "Emplacement")
+
+# Actions de la colonne ajoutée aux différences avec un horaire précédent
+ACTION_AJOUT = "Ajout"
+ACTION_MODIFICATION = "Modification"
+ACTION_SUPPRESSION = "Suppression"
+ENTETES_DIFFERENCES = ENTETES_HORAIRE + ("Action",)
+
+# Règles de la feuille Session, qui remplace la feuille Calendrier
+REGLE_DEBUT = "Début"
+REGLE_FIN = "Fin"
+REGLE_CONGE = "Congé"
+REGLE_PERMUTATION = "Permutation"
+JOURS_SEMAINE = ("Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche")
+MODES_JOURNEE = ("COMPLET", "AM", "PM")
+UN_JOUR = datetime.timedelta(days=1)
 
 def affiche_aide():
     """
@@ -16,10 +48,19 @@ def affiche_aide():
 
     print("")
     print("""
-    horaire.py -i <fichier_modele> -o <fichier_sortie> -h
+    horaire.py -i <fichier_modele> -o <fichier_sortie> [-d <horaire_precedent>] -h
+    horaire.py -o <dossier_sortie> [-f <format>] [-j <processus>] <modele_ou_dossier> ...
+    horaire.py -m -o <fichier_sortie> [-j <processus>] <modele_ou_dossier> ...
 
-    -i : Le chiffrier Excel contenant le modèle d'horaire.
-    -o : Le fichier dans lequel sera créé l'horaire.
+    -i : Le chiffrier Excel contenant le modèle d'horaire : feuille Cours et feuille Calendrier, ou Session pour décrire
+         la session par des règles (Début, Fin, jours de la semaine, Congé, Permutation). Un dossier traite en lot tous ses modèles.
+    -o : Le fichier dans lequel sera créé l'horaire : chiffrier Excel (.xlsx, par défaut), calendrier iCalendar (.ics) ou CSV (.csv) selon l'extension.
+         En lot, le dossier qui reçoit un horaire par modèle, nommé d'après le modèle.
+    -f : En lot, le format des horaires créés : xlsx (par défaut), ics ou csv.
+    -j : En lot, le nombre de processus qui traitent les modèles (nombre de processeurs par défaut).
+    -m, --merge : En lot, créer un seul chiffrier Excel avec une feuille et une table Horaires_<modèle> par modèle.
+    -d, --diff : Un horaire créé précédemment (.xlsx, .ics ou .csv). Seules les occurrences ajoutées, modifiées
+                 ou supprimées depuis sont écrites, avec une colonne Action.
     -h : L'aide de la commande.
     """)
 
@@ -32,7 +73,517 @@ def heure_en_string(date_cours, heure_cours):
     """
     return datetime.datetime.combine(date_cours, heure_cours).strftime("%Y-%m-%dT%H:%M:00")
 
-def creer_horaire(fichier_modele, fichier_sortie):
+def periode_cours(heure_debut):
+    """
+    Renvoyer la période (AM ou PM) d'un cours selon son heure de début
+    :param heure_debut: datetime.time
+    :return: string
+    """
+    return "AM" if heure_debut < MIDI else "PM"
+
+def indexer_cours(lignes_cours):
+    """
+    Indexer les cours une seule fois par jour et par mode de journée.
+
+        Paramètres
+        ----------
+        lignes_cours : iterable
+            Les lignes de la feuille Cours, sans l'en-tête :
+            (nom du cours, jour, heure début, heure fin, local)
+
+        Retour
+        ------
+        Un dictionnaire (jour, mode) -> liste des cours donnés ce jour-là dans ce
+        mode (COMPLET, AM ou PM), dans l'ordre de la feuille Cours.
+    """
+    index = {}
+    for ligne in lignes_cours:
+        # Ignorer les lignes vides sous le tableau
+        if all(valeur is None for valeur in ligne):
+            continue
+        cours = tuple(ligne[:5])
+        jour, heure_debut = cours[1], cours[2]
+        index.setdefault((jour, "COMPLET"), []).append(cours)
+        index.setdefault((jour, periode_cours(heure_debut)), []).append(cours)
+    return index
+
+def en_date(valeur):
+    """
+    Convertir une cellule en date
+    :param valeur: datetime.datetime, datetime.date ou string AAAA-MM-JJ
+    :return: datetime.date, None si la valeur n'est pas une date
+    """
+    if isinstance(valeur, datetime.datetime):
+        return valeur.date()
+    if isinstance(valeur, datetime.date):
+        return valeur
+    try:
+        return datetime.date.fromisoformat(str(valeur).strip())
+    except ValueError:
+        return None
+
+def lire_session(lignes_session):
+    """
+    Lire les règles de la feuille Session.
+
+    Chaque ligne contient une règle et ses valeurs :
+        Début | date                        premier jour de la session
+        Fin | date                          dernier jour de la session
+        Lundi ... Dimanche | jour           l'horaire suivi ce jour de la semaine, vide
+                                            pour aucun cours (par défaut, Lundi à
+                                            Vendredi suivent leur propre horaire)
+        Congé | date [| date fin]           une journée ou une période sans cours
+        Permutation | date | jour [| mode]  la date suit l'horaire d'un autre jour,
+                                            pour la journée (COMPLET) ou en AM, PM
+
+        Paramètres
+        ----------
+        lignes_session : iterable
+            Les lignes de la feuille Session, sans l'en-tête
+
+        Retour
+        ------
+        Le tuple (session, erreurs) : le dictionnaire des règles pour
+        developper_session et la liste des messages d'erreur.
+    """
+
+    session = {"debut": None, "fin": None, "conges": set(), "permutations": {},
+               "jours": dict(enumerate(JOURS_SEMAINE[:5]))}
+    erreurs = []
+    for numero, ligne in enumerate(lignes_session, start=2):
+        regle = texte_horaire(ligne[0]).strip() if ligne else ""
+        valeurs = tuple(ligne[1:4]) + (None,) * (4 - len(ligne))
+        if not regle:
+            continue
+        if regle in (REGLE_DEBUT, REGLE_FIN):
+            date_regle = en_date(valeurs[0])
+            if date_regle is None:
+                erreurs.append(f"Session, ligne {numero} : la date {valeurs[0]} n'est pas valide.")
+            session["debut" if regle == REGLE_DEBUT else "fin"] = date_regle
+        elif regle in JOURS_SEMAINE:
+            jour = texte_horaire(valeurs[0]).strip()
+            if jour:
+                session["jours"][JOURS_SEMAINE.index(regle)] = jour
+            else:
+                session["jours"].pop(JOURS_SEMAINE.index(regle), None)
+        elif regle == REGLE_CONGE:
+            debut_conge = en_date(valeurs[0])
+            fin_conge = debut_conge if valeurs[1] is None else en_date(valeurs[1])
+            if debut_conge is None or fin_conge is None or fin_conge < debut_conge:
+                erreurs.append(f"Session, ligne {numero} : le congé n'a pas de dates valides.")
+                continue
+            while debut_conge <= fin_conge:
+                session["conges"].add(debut_conge)
+                debut_conge += UN_JOUR
+        elif regle == REGLE_PERMUTATION:
+            date_regle = en_date(valeurs[0])
+            jour = texte_horaire(valeurs[1]).strip()
+            mode = texte_horaire(valeurs[2]).strip().upper() or MODES_JOURNEE[0]
+            if date_regle is None or not jour or mode not in MODES_JOURNEE:
+                erreurs.append(f"Session, ligne {numero} : la permutation doit avoir une date, "
+                               f"un jour et un mode {', '.join(MODES_JOURNEE)}.")
+                continue
+            session["permutations"][date_regle] = (jour, mode)
+        else:
+            erreurs.append(f"Session, ligne {numero} : la règle {regle} est inconnue.")
+
+    if session["debut"] is None or session["fin"] is None:
+        erreurs.append("Session : les règles Début et Fin sont obligatoires.")
+    elif session["fin"] < session["debut"]:
+        erreurs.append("Session : la Fin précède le Début.")
+
+    return session, erreurs
+
+def developper_session(session):
+    """
+    Générer les journées de la session à partir de ses règles, une à la fois.
+
+        Paramètres
+        ----------
+        session : dict
+            Les règles lues par lire_session
+
+        Retour
+        ------
+        Un générateur de tuples (date, jour, mode) comme les lignes de la
+        feuille Calendrier, sans les congés.
+    """
+    date_jour = session["debut"]
+    while date_jour <= session["fin"]:
+        # Une permutation s'applique même à une journée normalement sans cours
+        if date_jour in session["permutations"]:
+            yield (date_jour,) + session["permutations"][date_jour]
+        elif date_jour not in session["conges"] and date_jour.weekday() in session["jours"]:
+            yield date_jour, session["jours"][date_jour.weekday()], MODES_JOURNEE[0]
+        date_jour += UN_JOUR
+
+def developper_horaire(lignes_calendrier, index_cours):
+    """
+    Générer chaque occurrence de cours de la session, journée par journée.
+
+        Paramètres
+        ----------
+        lignes_calendrier : iterable
+            Les lignes de la feuille Calendrier, sans l'en-tête : (date, jour, mode)
+        index_cours : dict
+            Les cours indexés par indexer_cours
+
+        Retour
+        ------
+        Un générateur de tuples (sujet, date, heure début, heure fin, emplacement),
+        dans l'ordre du calendrier puis de la feuille Cours.
+    """
+    for ligne in lignes_calendrier:
+        date_jour, jour, mode_jour = ligne[:3]
+        for nom, _, heure_debut, heure_fin, local in index_cours.get((jour, mode_jour), ()):
+            yield nom, date_jour, heure_debut, heure_fin, local
+
+def ecrire_horaire_xlsx(lignes, fichier_sortie, entetes=ENTETES_HORAIRE):
+    """
+    Écrire les lignes de l'horaire dans la table Horaires d'un chiffrier,
+    une ligne à la fois, sans garder l'horaire en mémoire.
+
+        Paramètres
+        ----------
+        lignes : iterable
+            Les lignes de la table, produites par ligne_horaire ou comparer_horaires
+        fichier_sortie : str
+            Nom et chemin du chiffrier Excel à créer.
+        entetes : tuple
+            Les colonnes de la table
+    """
+
+    c_horaire = openpyxl.Workbook(write_only=True)
+    f_horaire = c_horaire.create_sheet("Horaire")
+
+    f_horaire.append(entetes)
+    ligne = 1
+
+    for ligne_table in lignes:
+        f_horaire.append(ligne_table)
+        ligne = ligne + 1
+
+    ajouter_table(f_horaire, 'Horaires', ligne, entetes)
+    c_horaire.save(filename=fichier_sortie)
+
+def ligne_horaire(evenement):
+    """
+    Convertir une occurrence de cours en ligne de la table Horaires
+    :param evenement: tuple (sujet, date, heure début, heure fin, emplacement)
+    :return: list [sujet, date début, date fin, emplacement]
+    """
+    sujet, date_cours, heure_debut, heure_fin, emplacement = evenement
+    return [sujet,
+            heure_en_string(date_cours, heure_debut),
+            heure_en_string(date_cours, heure_fin),
+            emplacement]
+
+def ajouter_table(f_horaire, nom_table, nombre_lignes, entetes=ENTETES_HORAIRE):
+    """
+    Ajouter la table des horaires, avec son en-tête, à une feuille en écriture seule.
+
+        Paramètres
+        ----------
+        f_horaire : openpyxl.worksheet
+            La feuille qui contient l'horaire, en-tête compris
+        nom_table : str
+            Le nom de la table, utilisé par PowerAutomate
+        nombre_lignes : int
+            Le nombre de lignes de la feuille, en-tête compris
+        entetes : tuple
+            Les colonnes de la table
+    """
+    # définir le style de la table
+    style_table = TableStyleInfo(name='TableStyleMedium2', showRowStripes=True)
+    # Créer la table et l'affecter à la feuille. En mode écriture seule, openpyxl
+    # ne peut pas relire les en-têtes : les colonnes et le filtre sont donnés ici.
+    # Une table Excel contient au moins une ligne de données, même vide
+    reference = f'A1:{get_column_letter(len(entetes))}{max(nombre_lignes, 2)}'
+    table = Table(ref=reference,
+                  displayName=nom_table,
+                  tableStyleInfo=style_table,
+                  autoFilter=AutoFilter(ref=reference),
+                  tableColumns=[TableColumn(id=colonne, name=entete)
+                                for colonne, entete in enumerate(entetes, start=1)])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        f_horaire.add_table(table)
+
+def ecrire_horaire_csv(lignes, fichier_sortie, entetes=ENTETES_HORAIRE):
+    """
+    Écrire les lignes de l'horaire dans un fichier CSV avec les colonnes de
+    la table Horaires, une ligne à la fois.
+
+        Paramètres
+        ----------
+        lignes : iterable
+            Les lignes de la table, produites par ligne_horaire ou comparer_horaires
+        fichier_sortie : str
+            Nom et chemin du fichier CSV à créer.
+        entetes : tuple
+            Les colonnes de la table
+    """
+    with open(fichier_sortie, "w", encoding="utf-8", newline="") as fichier:
+        ecrivain_csv = csv.writer(fichier)
+        ecrivain_csv.writerow(entetes)
+        ecrivain_csv.writerows(lignes)
+
+def heure_en_ical(heure):
+    """
+    Convertit une date de la table Horaires au format iCalendar (heure locale)
+    :param heure: string, par exemple 2022-08-22T08:15:00
+    :return: string, par exemple 20220822T081500
+    """
+    return heure.replace("-", "").replace(":", "")
+
+def heure_de_ical(heure):
+    """
+    Convertit une date iCalendar au format de la table Horaires
+    :param heure: string, par exemple 20220822T081500
+    :return: string, par exemple 2022-08-22T08:15:00
+    """
+    return f"{heure[0:4]}-{heure[4:6]}-{heure[6:8]}T{heure[9:11]}:{heure[11:13]}:{heure[13:15]}"
+
+def texte_ical(texte):
+    """
+    Échapper un texte pour une propriété iCalendar (RFC 5545, 3.3.11)
+    :param texte: string
+    :return: string
+    """
+    texte = "" if texte is None else str(texte)
+    for caractere, remplacement in (("\\", "\\\\"), (";", "\\;"), (",", "\\,"),
+                                    ("\r\n", "\\n"), ("\n", "\\n")):
+        texte = texte.replace(caractere, remplacement)
+    return texte
+
+def texte_de_ical(texte):
+    """
+    Retirer l'échappement d'un texte iCalendar (voir texte_ical)
+    :param texte: string
+    :return: string
+    """
+    return re.sub(r"\\(.)", lambda m: "\n" if m.group(1) in "nN" else m.group(1), texte)
+
+def ligne_ical(ligne):
+    """
+    Plier une ligne iCalendar à 75 octets et la terminer par CRLF (RFC 5545, 3.1)
+    :param ligne: string
+    :return: string
+    """
+    if len(ligne.encode("utf-8")) <= 75:
+        return ligne + "\r\n"
+    morceaux = []
+    morceau = ""
+    taille = 0
+    for caractere in ligne:
+        taille_caractere = len(caractere.encode("utf-8"))
+        # Les lignes de continuation commencent par une espace
+        if taille + taille_caractere > (75 if not morceaux else 74):
+            morceaux.append(morceau)
+            morceau = ""
+            taille = 0
+        morceau += caractere
+        taille += taille_caractere
+    morceaux.append(morceau)
+    return "\r\n ".join(morceaux) + "\r\n"
+
+def ecrire_horaire_ics(lignes, fichier_sortie, entetes=ENTETES_HORAIRE):
+    """
+    Écrire les lignes de l'horaire dans un calendrier iCalendar (.ics),
+    un événement à la fois. Les heures sont locales, comme dans la table Horaires.
+
+        Paramètres
+        ----------
+        lignes : iterable
+            Les lignes de la table, produites par ligne_horaire ou comparer_horaires
+        fichier_sortie : str
+            Nom et chemin du fichier iCalendar à créer.
+        entetes : tuple
+            Les colonnes de la table. Avec la colonne Action, les événements
+            supprimés sont annulés (STATUS:CANCELLED).
+    """
+    avec_action = len(entetes) > len(ENTETES_HORAIRE)
+    horodatage = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    with open(fichier_sortie, "w", encoding="utf-8", newline="") as fichier:
+        for ligne in ("BEGIN:VCALENDAR", "VERSION:2.0",
+                      "PRODID:-//cegepvictoetienne//horaire.py//FR", "CALSCALE:GREGORIAN"):
+            fichier.write(ligne_ical(ligne))
+        for ligne_table in lignes:
+            sujet, debut, fin, emplacement = ligne_table[:4]
+            # Un identifiant stable permet de réimporter le calendrier sans doublons
+            identifiant = hashlib.sha1(f"{sujet}|{heure_en_ical(debut)}|{emplacement}"
+                                       .encode("utf-8"))
+            proprietes = ["BEGIN:VEVENT",
+                          f"UID:{identifiant.hexdigest()}@horaire",
+                          f"DTSTAMP:{horodatage}",
+                          f"DTSTART:{heure_en_ical(debut)}",
+                          f"DTEND:{heure_en_ical(fin)}",
+                          f"SUMMARY:{texte_ical(sujet)}",
+                          f"LOCATION:{texte_ical(emplacement)}"]
+            if avec_action and ligne_table[4] == ACTION_SUPPRESSION:
+                proprietes.append("STATUS:CANCELLED")
+            proprietes.append("END:VEVENT")
+            for ligne in proprietes:
+                fichier.write(ligne_ical(ligne))
+        fichier.write(ligne_ical("END:VCALENDAR"))
+
+def lire_horaire_xlsx(fichier_horaire):
+    """
+    Lire les lignes de la table Horaires d'un horaire créé par ecrire_horaire_xlsx.
+    :param fichier_horaire: string
+    :return: générateur de tuples (sujet, date début, date fin, emplacement)
+    """
+    chiffrier = openpyxl.load_workbook(fichier_horaire, read_only=True, data_only=True)
+    try:
+        feuille = chiffrier["Horaire"] if "Horaire" in chiffrier else chiffrier.active
+        for ligne in feuille.iter_rows(min_row=2, max_col=len(ENTETES_HORAIRE),
+                                       values_only=True):
+            if ligne[0] is not None:
+                yield ligne
+    finally:
+        chiffrier.close()
+
+def lire_horaire_csv(fichier_horaire):
+    """
+    Lire les lignes d'un horaire créé par ecrire_horaire_csv.
+    :param fichier_horaire: string
+    :return: générateur de listes [sujet, date début, date fin, emplacement]
+    """
+    with open(fichier_horaire, encoding="utf-8-sig", newline="") as fichier:
+        lecteur = csv.reader(fichier)
+        next(lecteur, None)
+        for ligne in lecteur:
+            if ligne:
+                yield ligne[:len(ENTETES_HORAIRE)]
+
+def deplier_ical(fichier_ical):
+    """
+    Lire les lignes d'un fichier iCalendar en dépliant les lignes de continuation (RFC 5545, 3.1)
+    :param fichier_ical: string
+    :return: générateur de string
+    """
+    with open(fichier_ical, encoding="utf-8", newline="") as fichier:
+        ligne_courante = None
+        for ligne in fichier:
+            ligne = ligne.rstrip("\r\n")
+            if ligne[:1] in (" ", "\t") and ligne_courante is not None:
+                ligne_courante += ligne[1:]
+                continue
+            if ligne_courante is not None:
+                yield ligne_courante
+            ligne_courante = ligne
+        if ligne_courante is not None:
+            yield ligne_courante
+
+def lire_horaire_ics(fichier_horaire):
+    """
+    Lire les événements d'un horaire créé par ecrire_horaire_ics. Les événements
+    annulés sont ignorés.
+    :param fichier_horaire: string
+    :return: générateur de tuples (sujet, date début, date fin, emplacement)
+    """
+    proprietes = {}
+    for ligne in deplier_ical(fichier_horaire):
+        nom, _, valeur = ligne.partition(":")
+        nom = nom.split(";")[0].upper()
+        if nom == "BEGIN" and valeur == "VEVENT":
+            proprietes = {}
+        elif nom == "END" and valeur == "VEVENT":
+            if proprietes.get("STATUS") != "CANCELLED":
+                yield (texte_de_ical(proprietes.get("SUMMARY", "")),
+                       heure_de_ical(proprietes.get("DTSTART", "")),
+                       heure_de_ical(proprietes.get("DTEND", "")),
+                       texte_de_ical(proprietes.get("LOCATION", "")))
+        else:
+            proprietes[nom] = valeur
+
+def lire_horaire(fichier_horaire):
+    """
+    Lire un horaire créé par horaire.py, selon l'extension du fichier :
+    .ics, .csv, sinon un chiffrier Excel.
+    :param fichier_horaire: string
+    :return: générateur des lignes (sujet, date début, date fin, emplacement)
+    """
+    return LECTEURS_HORAIRE.get(os.path.splitext(fichier_horaire)[1].lower(),
+                                lire_horaire_xlsx)(fichier_horaire)
+
+def texte_horaire(valeur):
+    """
+    Convertir une cellule de l'horaire en texte, une cellule vide devenant ""
+    :param valeur: la valeur de la cellule
+    :return: string
+    """
+    return "" if valeur is None else str(valeur)
+
+def comparer_horaires(lignes, lignes_precedentes, compteur=None):
+    """
+    Générer les différences entre un horaire et un horaire créé précédemment.
+
+    Les occurrences sont identifiées par leur sujet, leur début et leur
+    emplacement, comme l'UID des événements iCalendar. Seul l'horaire précédent
+    est gardé en mémoire.
+
+        Paramètres
+        ----------
+        lignes : iterable
+            Les lignes du nouvel horaire, produites par ligne_horaire
+        lignes_precedentes : iterable
+            Les lignes de l'horaire précédent, lues par lire_horaire
+        compteur : dict
+            Reçoit le nombre de lignes par action, s'il est donné
+
+        Retour
+        ------
+        Un générateur des lignes ajoutées et modifiées, dans l'ordre du nouvel
+        horaire, puis des lignes supprimées, suivies de leur action.
+    """
+    compteur = {} if compteur is None else compteur
+    precedentes = {}
+    for ligne in lignes_precedentes:
+        precedentes[(texte_horaire(ligne[0]), texte_horaire(ligne[1]),
+                     texte_horaire(ligne[3]))] = ligne
+
+    for ligne in lignes:
+        cle = (texte_horaire(ligne[0]), ligne[1], texte_horaire(ligne[3]))
+        precedente = precedentes.pop(cle, None)
+        if precedente is None:
+            action = ACTION_AJOUT
+        elif texte_horaire(precedente[2]) != ligne[2]:
+            action = ACTION_MODIFICATION
+        else:
+            continue
+        compteur[action] = compteur.get(action, 0) + 1
+        yield list(ligne) + [action]
+
+    for ligne in precedentes.values():
+        compteur[ACTION_SUPPRESSION] = compteur.get(ACTION_SUPPRESSION, 0) + 1
+        yield list(ligne) + [ACTION_SUPPRESSION]
+
+def ouvrir_modele(fichier_modele):
+    """
+    Ouvrir un modèle d'horaire en lecture seule.
+
+        Paramètres
+        ----------
+        fichier_modele : str
+            Nom et chemin du chiffrier Excel contenant l'horaire à créer.
+    """
+    return openpyxl.load_workbook(fichier_modele, read_only=True, data_only=True)
+
+def ecrivain(fichier_sortie):
+    """
+    Renvoyer la fonction qui écrit l'horaire selon l'extension du fichier de
+    sortie : .ics, .csv, sinon un chiffrier Excel.
+
+        Paramètres
+        ----------
+        fichier_sortie : str
+            Nom et chemin du fichier à créer.
+    """
+    return ECRIVAINS_HORAIRE.get(os.path.splitext(fichier_sortie)[1].lower(),
+                                 ecrire_horaire_xlsx)
+
+def creer_horaire(fichier_modele, fichier_sortie, modele=None, fichier_precedent=None):
     """
     Lecture d'un modèle d'horaire (Excel) et
     création de toutes les entrées d'un cours pour la session.
@@ -42,61 +593,215 @@ def creer_horaire(fichier_modele, fichier_sortie):
         fichier_modele : str
             Nom et chemin du chiffrier Excel contenant l'horaire à créer.
         fichier_sortie : str
-            Nom et chemin du chiffrier Excel à créer.
+            Nom et chemin du fichier à créer : chiffrier Excel par défaut,
+            iCalendar (.ics) ou CSV (.csv) selon l'extension.
+        modele : openpyxl.Workbook
+            Le modèle déjà ouvert par valider_parametres, s'il est disponible.
+            Il est fermé à la fin.
+        fichier_precedent : str
+            Un horaire créé précédemment. Seules les occurrences ajoutées,
+            modifiées ou supprimées depuis sont écrites, avec une colonne Action.
     """
 
-    c_horaire = openpyxl.Workbook()
-    f_horaire = c_horaire[c_horaire.sheetnames[0]]
-    f_horaire.title = "Horaire"
+    if modele is None:
+        modele = ouvrir_modele(fichier_modele)
 
-    ligne = 1
+    try:
+        lignes = map(ligne_horaire, evenements_modele(modele))
+        if fichier_precedent is None:
+            ecrivain(fichier_sortie)(lignes, fichier_sortie)
+        else:
+            compteur = {}
+            ecrivain(fichier_sortie)(comparer_horaires(lignes, lire_horaire(fichier_precedent),
+                                                       compteur),
+                                     fichier_sortie, ENTETES_DIFFERENCES)
+            print(f"{compteur.get(ACTION_AJOUT, 0)} ajout(s), "
+                  f"{compteur.get(ACTION_MODIFICATION, 0)} modification(s), "
+                  f"{compteur.get(ACTION_SUPPRESSION, 0)} suppression(s).")
+    except Exception:
+        # Les écrivains ouvrent la sortie avant de développer l'horaire :
+        # ne pas laisser un horaire incomplet
+        if os.path.isfile(fichier_sortie):
+            os.remove(fichier_sortie)
+        raise
+    finally:
+        modele.close()
 
-    f_horaire.cell(row=ligne, column=1).value = "Sujet"
-    f_horaire.cell(row=ligne, column=2).value = "Date début"
-    f_horaire.cell(row=ligne, column=3).value = "Date fin"
-    f_horaire.cell(row=ligne, column=4).value = "Emplacement"
-
-    modele = openpyxl.load_workbook(fichier_modele, data_only=True)
-
-    f_calendrier = modele["Calendrier"]
-    f_cours = modele["Cours"]
-
-    midi = datetime.time(12, 0, 0)
-
-    for ligne_calendrier in range(2, f_calendrier.max_row + 1):
-        for l_cours in range(2, f_cours.max_row + 1):
-            mode_jour = f_calendrier.cell(row=ligne_calendrier, column=3).value
-            mode_horaire = "AM" if f_cours.cell(row=l_cours, column=3).value < midi else "PM"
-
-            if (
-                mode_jour in ("COMPLET", mode_horaire) and
-                f_calendrier.cell(row=ligne_calendrier, column=2).value ==
-                  f_cours.cell(row=l_cours, column=2).value
-                ):
-                ligne = ligne + 1
-                f_horaire.cell(row=ligne, column=1).value = f_cours.cell(
-                                                                row=l_cours,
-                                                                column=1).value
-                f_horaire.cell(row=ligne, column=2).value = heure_en_string(
-                    f_calendrier.cell(row=ligne_calendrier, column=1).value,
-                    f_cours.cell(row=l_cours, column=3).value)
-                f_horaire.cell(row=ligne, column=3).value = heure_en_string(
-                    f_calendrier.cell(row=ligne_calendrier, column=1).value,
-                    f_cours.cell(row=l_cours, column=4).value)
-                f_horaire.cell(row=ligne, column=4).value = f_cours.cell(
-                                                                row=l_cours,
-                                                                column=5).value
+def evenements_modele(modele):
+    """
+    Générer les occurrences de cours d'un modèle ouvert (voir developper_horaire).
 
-    # définir le style de la table
-    style_table = openpyxl.worksheet.table.TableStyleInfo(name='TableStyleMedium2',
-                                                        showRowStripes=True)
-    # Créer la table et l'affecter à la feuille
-    f_horaire.add_table(openpyxl.worksheet.table.Table(ref=f'A1:D{ligne}',
-                                        displayName='Horaires',
-                                        tableStyleInfo=style_table))
-    c_horaire.save(filename=fichier_sortie)
+        Paramètres
+        ----------
+        modele : openpyxl.Workbook
+            Le modèle ouvert par ouvrir_modele
+    """
+    # Chaque journée du calendrier ne consulte que ses propres cours
+    index_cours = indexer_cours(modele["Cours"].iter_rows(min_row=2, values_only=True))
+    if "Session" in modele:
+        session, _ = lire_session(modele["Session"].iter_rows(min_row=2, values_only=True))
+        calendrier = developper_session(session)
+    else:
+        calendrier = modele["Calendrier"].iter_rows(min_row=2, values_only=True)
+    return developper_horaire(calendrier, index_cours)
 
-def valider_parametres(fichier_modele):
+def traiter_modele(fichier_modele, fichier_sortie=None):
+    """
+    Valider un modèle et créer son horaire dans un processus de travail.
+
+    La sortie console est capturée pour être réaffichée par le processus
+    principal dans l'ordre des modèles.
+
+        Paramètres
+        ----------
+        fichier_modele : str
+            Nom et chemin du modèle d'horaire
+        fichier_sortie : str
+            Le fichier à créer, None pour renvoyer les lignes de l'horaire
+
+        Retour
+        ------
+        Le tuple (succes, lignes, sortie) : True si l'horaire a été créé, les lignes
+        de la table Horaires si fichier_sortie est None, None sinon, et les messages
+        affichés.
+    """
+    sortie = io.StringIO()
+    succes = False
+    lignes = None
+    with redirect_stdout(sortie):
+        # Un modèle mal formé ne doit pas interrompre le lot
+        try:
+            modele = valider_parametres(fichier_modele)
+            if modele is not None:
+                if fichier_sortie is None:
+                    try:
+                        lignes = [ligne_horaire(evenement)
+                                  for evenement in evenements_modele(modele)]
+                    finally:
+                        modele.close()
+                else:
+                    creer_horaire(fichier_modele, fichier_sortie, modele)
+                    print(f'Horaire créé : "{fichier_sortie}"')
+                succes = True
+        except Exception as erreur: # pylint: disable=broad-except
+            print(f"Erreur pendant le traitement du modèle : {erreur!r}")
+            lignes = None
+        if not succes:
+            print(f'Modèle ignoré : "{fichier_modele}"')
+    return succes, lignes, sortie.getvalue()
+
+def lister_modeles(chemins):
+    """
+    Lister les modèles d'horaire à traiter en lot.
+
+        Paramètres
+        ----------
+        chemins : list
+            Des modèles d'horaire ou des dossiers qui en contiennent
+
+        Retour
+        ------
+        La liste des modèles : les chiffriers de chaque dossier, triés, et les
+        fichiers donnés tels quels.
+    """
+    modeles = []
+    for chemin in chemins:
+        if os.path.isdir(chemin):
+            # Les fichiers ~$... sont les verrous d'Excel pendant l'édition
+            modeles.extend(os.path.join(chemin, nom) for nom in sorted(os.listdir(chemin))
+                           if nom.lower().endswith(".xlsx") and not nom.startswith("~$"))
+        else:
+            modeles.append(chemin)
+    return modeles
+
+def nom_unique(nom, noms_utilises):
+    """
+    Renvoyer le nom, suivi d'un numéro s'il est déjà utilisé, et le noter comme utilisé.
+    :param nom: string
+    :param noms_utilises: set
+    :return: string
+    """
+    nom_propose = nom
+    numero = 1
+    while nom_propose.lower() in noms_utilises:
+        numero += 1
+        nom_propose = f"{nom}_{numero}"
+    noms_utilises.add(nom_propose.lower())
+    return nom_propose
+
+def creer_horaires(fichiers_modeles, sortie, extension=".xlsx", nombre_processus=1,
+                   fusionner=False):
+    """
+    Créer les horaires de plusieurs modèles en parallèle.
+
+        Paramètres
+        ----------
+        fichiers_modeles : list
+            Les modèles d'horaire à traiter
+        sortie : str
+            Le dossier qui reçoit un horaire par modèle, nommé d'après le modèle,
+            ou le chiffrier à créer si fusionner est True
+        extension : str
+            Le format des horaires créés dans le dossier : .xlsx, .ics ou .csv
+        nombre_processus : int
+            Le nombre de processus qui traitent les modèles en parallèle
+        fusionner : bool
+            True pour créer un seul chiffrier avec une feuille et une table
+            Horaires_<modèle> par modèle
+
+        Retour
+        ------
+        Le nombre d'horaires créés.
+    """
+    if fusionner:
+        sorties = [None] * len(fichiers_modeles)
+        c_horaire = openpyxl.Workbook(write_only=True)
+        noms_feuilles = set()
+        noms_tables = set()
+    else:
+        # Deux modèles du même nom, dans des dossiers différents, ne s'écrasent pas
+        noms_sorties = set()
+        sorties = [os.path.join(sortie, nom_unique(os.path.splitext(os.path.basename(fichier))[0],
+                                                   noms_sorties) + extension)
+                   for fichier in fichiers_modeles]
+
+    nombre_horaires = 0
+    with ProcessPoolExecutor(max_workers=nombre_processus) as executeur:
+        # Les résultats arrivent dans l'ordre des modèles
+        resultats = executeur.map(traiter_modele, fichiers_modeles, sorties)
+        for fichier_modele, (succes, lignes, texte) in zip(fichiers_modeles, resultats):
+            print(texte, end="")
+            if not succes:
+                continue
+            nombre_horaires += 1
+            if not fusionner:
+                continue
+
+            nom_modele = os.path.splitext(os.path.basename(fichier_modele))[0]
+            titre = nom_unique(re.sub(r"[][\\/?*:]", "_", nom_modele)[:28], noms_feuilles)
+            f_horaire = c_horaire.create_sheet(titre)
+            f_horaire.append(ENTETES_HORAIRE)
+            for ligne in lignes:
+                f_horaire.append(ligne)
+            nom_table = nom_unique("Horaires_" + re.sub(r"\W", "_", nom_modele), noms_tables)
+            ajouter_table(f_horaire, nom_table, len(lignes) + 1)
+
+    if fusionner and nombre_horaires:
+        c_horaire.save(filename=sortie)
+        print(f'Horaires fusionnés : "{sortie}"')
+    return nombre_horaires
+
+ECRIVAINS_HORAIRE = {
+    ".csv" : ecrire_horaire_csv,
+    ".ics" : ecrire_horaire_ics,
+    }
+
+LECTEURS_HORAIRE = {
+    ".csv" : lire_horaire_csv,
+    ".ics" : lire_horaire_ics,
+    }
+
+def valider_parametres(fichier_modele, fichier_precedent=None):
     """
         Valide l'ensemble des paramètres reçus en ligne de commande.
         Vérifie que le chiffrier contient bien les critères nécessaires.
@@ -105,36 +810,103 @@ def valider_parametres(fichier_modele):
         ----------
         fichier_modele : str
             Nom et chemin du chiffrier Excel contenant l'horaire à créer.
-        fichier_sortie : str
-            Nom et chemin du chiffrier Excel à créer.
+        fichier_precedent : str
+            L'horaire précédent avec lequel comparer, s'il est donné.
 
         Retour
         ------
-        True si tout est valide.
+        Le modèle ouvert en lecture seule si tout est valide, None sinon.
     """
 
     parametres_valides = True
+    chiffrier = None
 
     # Validation des paramètres
     if not os.path.isfile(fichier_modele):
         print(f"Le fichier d'entrée {fichier_modele} n'existe pas.")
-        parametres_valides = False
+        return None
+    if fichier_precedent is not None and not os.path.isfile(fichier_precedent):
+        print(f"L'horaire précédent {fichier_precedent} n'existe pas.")
+        return None
 
     # Vérifier si le fichier d'entrée est un chiffrier Excel
     try:
-        chiffrier = openpyxl.load_workbook(fichier_modele, data_only=True)
+        chiffrier = ouvrir_modele(fichier_modele)
 
         # Vérifier si la feuille existe
-        if "Calendrier" not in chiffrier:
-            print("La feuille Calendrier n'existe pas.")
+        # La feuille Session, si elle existe, remplace la feuille Calendrier
+        if "Session" in chiffrier:
+            _, erreurs = lire_session(chiffrier["Session"].iter_rows(min_row=2,
+                                                                    values_only=True))
+            for erreur in erreurs:
+                print(erreur)
+                parametres_valides = False
+        elif "Calendrier" not in chiffrier:
+            print("La feuille Calendrier (ou Session) n'existe pas.")
             parametres_valides = False
         if "Cours" not in chiffrier:
             print("La feuille Cours n'existe pas.")
             parametres_valides = False
-    except BadZipFile:
+    except (BadZipFile, KeyError, InvalidFileException):
+        # Un zip qui n'est pas un classeur lève KeyError dans openpyxl
         print(f"Le fichier d'entrée {fichier_modele} n'est pas un chiffrier Excel valide.")
         parametres_valides = False
 
+    if not parametres_valides:
+        if chiffrier is not None:
+            chiffrier.close()
+        return None
+    return chiffrier
+
+def valider_parametres_lot(fichiers_modeles, sortie, format_sortie, nombre_processus,
+                           fusionner, fichier_precedent=None):
+    """
+        Valide les paramètres du traitement en lot. Chaque modèle est validé
+        ensuite par le processus qui le traite.
+
+        Paramètres
+        ----------
+        fichiers_modeles : list
+            Les modèles d'horaire à traiter
+        sortie : str
+            Le dossier de sortie, ou le chiffrier à créer si fusionner est True
+        format_sortie : str
+            Le format des horaires créés dans le dossier de sortie : xlsx, ics ou csv
+        nombre_processus : int
+            Le nombre de processus qui traitent les modèles
+        fusionner : bool
+            True pour créer un seul chiffrier avec une table par modèle
+        fichier_precedent : str
+            L'horaire précédent de l'option -d, qui ne s'applique qu'à un seul modèle
+
+        Retour
+        ------
+        True si tout est valide, False sinon.
+    """
+
+    parametres_valides = True
+
+    if not fichiers_modeles:
+        print("Aucun modèle d'horaire à traiter.")
+        parametres_valides = False
+    if fichier_precedent is not None:
+        print("La comparaison avec un horaire précédent (-d) ne traite qu'un seul modèle.")
+        parametres_valides = False
+    if nombre_processus < 1:
+        print("Le nombre de processus doit être un entier positif.")
+        parametres_valides = False
+    if fusionner:
+        if os.path.splitext(sortie)[1].lower() != ".xlsx":
+            print("Le fichier de sortie fusionné doit être un chiffrier Excel (.xlsx).")
+            parametres_valides = False
+    else:
+        if not os.path.isdir(sortie):
+            print(f"Le dossier de sortie {sortie} n'existe pas.")
+            parametres_valides = False
+        if "." + format_sortie not in ECRIVAINS_HORAIRE and format_sortie != "xlsx":
+            print(f"Le format {format_sortie} n'est pas supporté : xlsx, ics ou csv.")
+            parametres_valides = False
+
     return parametres_valides
 
 def main(argv):
@@ -144,11 +916,15 @@ def main(argv):
 
     fichier_modele = ''
     fichier_sortie = ''
+    format_sortie = 'xlsx'
+    nombre_processus = os.cpu_count() or 1
+    fusionner = False
+    fichier_precedent = None
 
     currentdir = os.getcwd()
 
     try:
-        opts, _ = getopt.getopt(argv,"hi:o:")
+        opts, args = getopt.getopt(argv,"hi:o:f:j:md:",["merge", "diff="])
     except getopt.GetoptError:
         affiche_aide()
         sys.exit(2)
@@ -160,11 +936,35 @@ def main(argv):
             fichier_modele = os.path.join(currentdir, arg)
         elif opt == '-o':
             fichier_sortie = os.path.join(currentdir, arg)
+        elif opt == '-f':
+            format_sortie = arg.lower().lstrip(".")
+        elif opt == '-j':
+            try:
+                nombre_processus = int(arg)
+            except ValueError:
+                nombre_processus = 0
+        elif opt in ('-m', '--merge'):
+            fusionner = True
+        elif opt in ('-d', '--diff'):
+            fichier_precedent = os.path.join(currentdir, arg)
+
+    chemins = [os.path.join(currentdir, arg) for arg in args]
+    if fichier_modele and (chemins or os.path.isdir(fichier_modele)):
+        # Traitement en lot
+        chemins.insert(0, fichier_modele)
+    if chemins:
+        fichiers_modeles = lister_modeles(chemins)
+        if valider_parametres_lot(fichiers_modeles, fichier_sortie, format_sortie,
+                                  nombre_processus, fusionner, fichier_precedent):
+            creer_horaires(fichiers_modeles, fichier_sortie, "." + format_sortie,
+                           nombre_processus, fusionner)
+        return
 
-    if valider_parametres(fichier_modele):
+    modele = valider_parametres(fichier_modele, fichier_precedent)
+    if modele is not None:
         print(f'Fichier d\'entrée est : "{fichier_modele}"')
         print(f'Fichier de sortie est : "{fichier_sortie}"')
-        creer_horaire(fichier_modele, fichier_sortie)
+        creer_horaire(fichier_modele, fichier_sortie, modele, fichier_precedent)
 
 if __name__ == "__main__":
     main(sys.argv[1:])
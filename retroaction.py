@@ -7,18 +7,51 @@
  par ligne dans la colonne A) et chaque élève par colonne (à partir de la colonne B)
 
 """
+import abc
+import bz2
+import csv
 import getopt
+import hashlib
+import io
+import json
 import os
+import re
+import shutil
+import statistics
 import sys
-
+import tempfile
+import threading
+import time
+import traceback
+import zlib
+
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+from fnmatch import fnmatchcase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from xml.etree import ElementTree
 
 from zipfile import BadZipFile
-from zipfile import ZipFile
+from zipfile import ZipFile, ZipInfo
+from zipfile import ZIP_BZIP2, ZIP_DEFLATED, ZIP_STORED
 
 import openpyxl # type: ignore
+from openpyxl.cell import WriteOnlyCell # type: ignore
+from openpyxl.utils import get_column_letter # type: ignore
+from openpyxl.utils.exceptions import InvalidFileException # type: ignore
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
 from fpdf import FPDF # type: ignore
-from fpdf.enums import XPos, YPos # type: ignore
+from fpdf.enums import Align, XPos, YPos # type: ignore
+from fpdf.fpdf import SubsetMap # type: ignore
+from fpdf.line_break import MultiLineBreak, TextLine # type: ignore
 
 # Constantes
 
@@ -33,6 +66,21 @@ LIBELLE_NOM = "Nom"
 LIBELLE_PRENOM = "Prénom"
 LIBELLE_COMMENTAIRES = "Commentaires"
 LIBELLE_SELECTION = "Générer"
+LIBELLES_CRITERES = (
+    LIBELLE_NOM,
+    LIBELLE_PRENOM,
+    LIBELLE_DA,
+    LIBELLE_NOTES,
+    LIBELLE_SELECTION,
+    LIBELLE_COMMENTAIRES,
+    )
+
+# Nombres reconnus dans les fichiers CSV, sans zéro en tête pour les entiers
+MOTIF_ENTIER_CSV = re.compile(r"-?(0|[1-9][0-9]*)")
+MOTIF_DECIMAL_CSV = re.compile(r"-?[0-9]+\.[0-9]+")
+
+FEUILLE_STATISTIQUES = "Statistiques"
+LARGEUR_CLASSE_HISTOGRAMME = 10
 
 HAUTEUR_CELLULE = 0.3
 LARGEUR_TITRE = 6
@@ -43,12 +91,100 @@ CHEMIN_POLICE_REGULIER = os.path.join(DOSSIER_SCRIPT, "SourceSansPro-Regular.ttf
 CHEMIN_POLICE_GRAS = os.path.join(DOSSIER_SCRIPT, "SourceSansPro-Bold.ttf")
 NOM_POLICE = "SourceSansPro"
 
+NOM_MANIFESTE = "manifeste.json"
+NOM_PROFIL = "profil.json"
+NOMBRE_ELEVES_LENTS = 5
+# Nombre d'élèves envoyés à la fois à un processus de travail
+TAILLE_LOT = 8
+# Méthodes de compression des membres de travaux.zip (option --compression)
+METHODES_COMPRESSION = {
+    "stored" : ZIP_STORED,
+    "deflated" : ZIP_DEFLATED,
+    "bzip2" : ZIP_BZIP2,
+    }
+# Méthode et niveau de compression par défaut de travaux.zip
+COMPRESSION_ZIP = (ZIP_DEFLATED, 6)
+# Délai entre deux vérifications du chiffrier en mode --watch, en secondes
+INTERVALLE_SURVEILLANCE = 0.2
+# Service HTTP local (option --serve) : adresse, port par défaut, nombre de
+# traitements simultanés par défaut, taille maximale d'un chiffrier reçu et
+# nombre de latences conservées pour les métriques
+HOTE_SERVICE = "127.0.0.1"
+PORT_SERVICE = 8765
+NOMBRE_TRAVAUX_SIMULTANES = 2
+TAILLE_MAX_CHIFFRIER = 50 * 1024 * 1024
+NOMBRE_LATENCES = 1000
+# À incrémenter lorsque le rendu des PDF change, pour invalider les manifestes existants
+VERSION_RENDU = 2
+
+# Polices TrueType déjà analysées dans ce processus, par (clé de police, fichier)
+CACHE_POLICES = {}
+# Lignes découpées des titres répétés d'une fiche à l'autre,
+# par (texte, largeur, police, style, taille, markdown). Les entrées les moins
+# récemment utilisées sont retirées : le service garde son processus indéfiniment.
+CACHE_MISE_EN_PAGE = OrderedDict()
+TAILLE_CACHE_MISE_EN_PAGE = 4096
+VERROU_MISE_EN_PAGE = threading.Lock()
+
+
+class Grille:
+    """
+        Grille d'évaluation partagée par tous les élèves d'une feuille
+    """
+    __slots__ = ("titres", "commentaires", "titres_affiches", "lignes_criteres")
+
+    def __init__(self, titres=(), lignes_criteres=None):
+        """
+            Initialiser la grille d'évaluation.
+
+            Paramètres
+            ----------
+            titres : list
+                Titres des critères, dans l'ordre de la feuille
+            lignes_criteres : dict
+                Les lignes des critères de base, trouvées par trouver_lignes_criteres
+        """
+        self.titres = []
+        self.commentaires = []
+        self.titres_affiches = []
+        self.lignes_criteres = {} if lignes_criteres is None else lignes_criteres
+        for titre in titres:
+            self.ajouter_titre(titre)
+
+    def ajouter_titre(self, titre):
+        """
+            Ajouter un critère à la fin de la grille.
+
+            Paramètres
+            ----------
+            titre : str
+                Titre du critère, qui contient {texte} pour un commentaire
+        """
+        commentaire = '{texte}' in titre
+        self.titres.append(titre)
+        self.commentaires.append(commentaire)
+        self.titres_affiches.append(titre.replace('{texte}', '') if commentaire else titre)
+
+    def rangees(self, valeurs):
+        """
+            Renvoyer les rangées (titre, valeur, commentaire) du tableau d'un élève.
+
+            Paramètres
+            ----------
+            valeurs : tuple
+                Les valeurs de l'élève, dans l'ordre des critères
+        """
+        return zip(self.titres_affiches, valeurs, self.commentaires)
+
 
 class Eleve:
     """
         Classe contenant les données de l'élève et de ses résultats
     """
-    def __init__(self, numero_da="0", prenom="", nom="", note=0):
+    __slots__ = ("prenom", "nom", "note", "denominateur", "commentaires", "numero_da",
+                 "grille", "valeurs")
+
+    def __init__(self, numero_da="0", prenom="", nom="", note=0, grille=None):
         """
             Initialiser les données de l'élève.
 
@@ -62,6 +198,8 @@ class Eleve:
                 Nom de famille de l'élève
             note : float
                 Note finale de l'élève
+            grille : Grille
+                Grille d'évaluation partagée, une grille propre à l'élève si absente
         """
         self.prenom = prenom
         self.nom = nom
@@ -69,7 +207,16 @@ class Eleve:
         self.denominateur = 1
         self.commentaires = ""
         self.numero_da = numero_da
-        self.notes = []
+        self.grille = Grille() if grille is None else grille
+        # Valeurs de l'élève, dans l'ordre des critères de la grille
+        self.valeurs = ()
+
+    @property
+    def notes(self):
+        """
+            Renvoyer la liste des notes (titre, valeur) de l'élève.
+        """
+        return list(zip(self.grille.titres, self.valeurs))
 
     def ajout_note(self, titre, valeur):
         """
@@ -82,7 +229,39 @@ class Eleve:
             valeur : str
                 Valeur du critère évalué
         """
-        self.notes.append((titre, valeur))
+        index = len(self.valeurs)
+        if index == len(self.grille.titres):
+            self.grille.ajouter_titre(titre)
+        elif self.grille.titres[index] != titre:
+            raise ValueError(f"Le critère {titre} ne correspond pas au critère "
+                             f"{self.grille.titres[index]} de la grille.")
+        self.valeurs += (valeur,)
+
+    def empreinte(self, titre_feuille):
+        """
+            Renvoyer l'empreinte du contenu de la fiche de l'élève.
+
+            Paramètres
+            ----------
+            titre_feuille : str
+                Titre du document généré
+        """
+        contenu = json.dumps(
+            [
+                VERSION_RENDU,
+                titre_feuille,
+                self.numero_da,
+                self.nom,
+                self.prenom,
+                self.note,
+                self.denominateur,
+                self.commentaires,
+                self.notes,
+            ],
+            default=str,
+            ensure_ascii=False
+            )
+        return hashlib.sha256(contenu.encode("utf-8")).hexdigest()
 
     def nom_pdf(self):
         """
@@ -109,6 +288,153 @@ class Eleve:
         return round(self.note / self.denominateur * 100)
 
 
+def memoire_max(qui=None):
+    """
+        Renvoyer le pic de mémoire résidente, en octets.
+
+        Paramètres
+        ----------
+        qui : int
+            resource.RUSAGE_SELF (par défaut) ou resource.RUSAGE_CHILDREN
+
+        Retour
+        ------
+        Le pic de mémoire, None si la plateforme ne le fournit pas.
+    """
+    if resource is None:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF if qui is None else qui).ru_maxrss
+    # ru_maxrss est en octets sur macOS et en kilo-octets ailleurs
+    return pic if sys.platform == "darwin" else pic * 1024
+
+
+class Profil:
+    """
+        Mesures de temps et de mémoire d'une exécution (option --profile)
+    """
+    def __init__(self, actif=False):
+        """
+            Initialiser le profil.
+
+            Paramètres
+            ----------
+            actif : bool
+                False pour que les mesures ne fassent rien
+        """
+        self.actif = actif
+        self.phases = {}
+        self.durees_eleves = {}
+
+    @contextmanager
+    def mesurer(self, phase):
+        """
+            Mesurer la durée et le pic de mémoire d'une phase.
+
+            Le pic est celui du processus depuis son démarrage : une phase qui
+            l'augmente est celle qui a demandé le plus de mémoire jusque-là.
+
+            Paramètres
+            ----------
+            phase : str
+                Nom de la phase mesurée
+        """
+        if not self.actif:
+            yield
+            return
+
+        pic_avant = memoire_max()
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            pic_apres = memoire_max()
+            self.phases[phase] = {
+                "duree_s" : time.perf_counter() - debut,
+                "memoire_max_octets" : pic_apres,
+                "memoire_ajoutee_octets" : (None if pic_apres is None
+                                            else pic_apres - pic_avant),
+                }
+
+    def cumuler(self, phase, duree):
+        """
+            Ajouter une durée à une sous-phase mesurée en plusieurs morceaux.
+
+            Les morceaux mesurés dans des processus de travail différents
+            s'additionnent : la somme est un temps de calcul, pas une durée réelle.
+
+            Paramètres
+            ----------
+            phase : str
+                Nom de la sous-phase
+            duree : float
+                Durée à ajouter, en secondes
+        """
+        if self.actif:
+            mesure = self.phases.setdefault(phase, {"duree_s" : 0.0})
+            mesure["duree_s"] += duree
+
+    def ajouter_eleve(self, numero_da, duree):
+        """
+            Noter la durée de création du PDF d'un élève.
+
+            Paramètres
+            ----------
+            numero_da : str
+                Numéro du dossier d'admission de l'élève
+            duree : float
+                Durée de création du PDF, en secondes
+        """
+        if self.actif:
+            self.durees_eleves[numero_da] = duree
+
+    def eleves_lents(self):
+        """
+            Renvoyer les élèves dont le PDF a été le plus long à créer.
+        """
+        return sorted(self.durees_eleves.items(), key=lambda element: element[1],
+                      reverse=True)[:NOMBRE_ELEVES_LENTS]
+
+    def afficher(self):
+        """
+            Afficher le sommaire du profil.
+        """
+        print("Profil de l'exécution :")
+        for phase, mesure in self.phases.items():
+            ligne = f"    {phase:<28} {mesure['duree_s']:8.3f} s"
+            if mesure.get("memoire_max_octets") is not None:
+                ligne += (f"  pic {mesure['memoire_max_octets'] / 1024 / 1024:8.1f} Mo"
+                          f" (+{mesure['memoire_ajoutee_octets'] / 1024 / 1024:.1f} Mo)")
+            print(ligne)
+        for numero_da, duree in self.eleves_lents():
+            print(f"    Élève {numero_da} : {duree:.3f} s")
+
+    def ecrire(self, dossier_sortie, informations):
+        """
+            Écrire le rapport JSON du profil dans le dossier de sortie.
+
+            Paramètres
+            ----------
+            dossier_sortie : str
+                Chemin du dossier qui contient travaux.zip
+            informations : dict
+                Paramètres de l'exécution à inclure dans le rapport
+        """
+        rapport = {
+            "date" : datetime.now().isoformat(timespec="seconds"),
+            **informations,
+            "phases" : self.phases,
+            "memoire_max_processus_travail_octets" : (
+                memoire_max(resource.RUSAGE_CHILDREN) if resource else None),
+            "eleves_lents" : [
+                {"numero_da" : numero_da, "duree_s" : duree}
+                for numero_da, duree in self.eleves_lents()
+                ],
+            "eleves" : self.durees_eleves,
+            }
+        with open(os.path.join(dossier_sortie, NOM_PROFIL), "w", encoding="utf-8") as fichier:
+            json.dump(rapport, fichier, indent=1, ensure_ascii=False)
+
+
 class FeuilleEvaluation(FPDF):
     """
     Générer la page d'évaluation
@@ -123,11 +449,158 @@ class FeuilleEvaluation(FPDF):
                 Titre de la page
         """
         self.titre = titre
+        # Position du haut du contenu, sous l'entête de page
+        self.y_contenu = 0
 
         super().__init__(orientation='P', unit='in', format="Letter")
-        self.add_font(NOM_POLICE, fname=CHEMIN_POLICE_REGULIER)
-        self.add_font(family=NOM_POLICE, style='B', fname=CHEMIN_POLICE_GRAS)
+        self.ajouter_police(NOM_POLICE, CHEMIN_POLICE_REGULIER)
+        self.ajouter_police(NOM_POLICE, CHEMIN_POLICE_GRAS, style='B')
+
+    def ajouter_police(self, famille, fichier, style=''):
+        """
+        Ajouter une police TrueType au document.
+
+        Le fichier n'est lu et analysé qu'une fois par processus, les
+        documents suivants réutilisent ses métriques.
+
+        Paramètres
+        ----------
+        famille : str
+            Nom de la famille de police
+        fichier : str
+            Chemin du fichier TTF
+        style : str
+            Style de la police ('' ou 'B')
+        """
+        cle_police = f"{famille.lower()}{style}"
+        cle_cache = (cle_police, fichier)
+
+        if cle_cache not in CACHE_POLICES:
+            self.add_font(famille, style=style, fname=fichier)
+            police = dict(self.fonts[cle_police])
+            # L'index et les caractères utilisés sont propres à chaque document
+            del police["i"]
+            del police["subset"]
+            CACHE_POLICES[cle_cache] = (police, dict(self.font_files[cle_police]))
+            return
+
+        police, fichier_police = CACHE_POLICES[cle_cache]
+
+        # Mêmes caractères réservés que FPDF.add_font
+        caracteres_reserves = "\x00 "
+        if self.str_alias_nb_pages:
+            caracteres_reserves += "0123456789" + self.str_alias_nb_pages
+
+        self.fonts[cle_police] = {
+            "i": len(self.fonts) + 1,
+            **police,
+            "subset": SubsetMap(map(ord, caracteres_reserves)),
+            }
+        self.font_files[cle_police] = dict(fichier_police)
+
+
+    def decouper_texte(self, texte, largeur, markdown=False, memoriser=True):
+        """
+        Découper un texte en lignes pour la largeur donnée, avec la police courante.
+
+        Le découpage est conservé pour les documents suivants du même processus,
+        les titres des critères n'étant mesurés qu'une seule fois, dans la limite
+        de TAILLE_CACHE_MISE_EN_PAGE entrées.
+
+        Paramètres
+        ----------
+        texte : str
+            Texte à découper
+        largeur : float
+            Largeur de la cellule
+        markdown : bool
+            True si le texte contient du formatage markdown
+        memoriser : bool
+            False pour les textes propres à un élève, qui ne sont pas conservés
+
+        Retour
+        ------
+        Les lignes du texte, telles que découpées par multi_cell.
+        """
+        cle = (texte, largeur, self.font_family, self.font_style, self.font_size_pt, markdown)
+        with VERROU_MISE_EN_PAGE:
+            lignes = CACHE_MISE_EN_PAGE.get(cle)
+            if lignes is not None:
+                CACHE_MISE_EN_PAGE.move_to_end(cle)
+                return lignes
+
+        # Même découpage que FPDF.multi_cell, sans rien dessiner
+        largeur_maximale = (largeur - 2 * self.c_margin) * 1000 / self.font_size
+        fragments = self._preload_font_styles(
+            self.normalize_text(texte).replace("\r", ""), markdown)
+        decoupage = MultiLineBreak(
+            fragments,
+            self.get_normalized_string_width_with_style,
+            justify=False
+            )
+        lignes = []
+        ligne = decoupage.get_line_of_given_width(largeur_maximale)
+        while ligne is not None:
+            lignes.append(ligne)
+            ligne = decoupage.get_line_of_given_width(largeur_maximale)
+        if not lignes:
+            # Toujours au moins une cellule, même pour un texte vide
+            lignes.append(TextLine("", text_width=0, number_of_spaces_between_words=0,
+                                   justify=False))
+
+        lignes = tuple(lignes)
+        if memoriser:
+            with VERROU_MISE_EN_PAGE:
+                CACHE_MISE_EN_PAGE[cle] = lignes
+                if len(CACHE_MISE_EN_PAGE) > TAILLE_CACHE_MISE_EN_PAGE:
+                    CACHE_MISE_EN_PAGE.popitem(last=False)
+        return lignes
+
+    def ecrire_lignes(self, lignes, largeur, hauteur, bordure, align, new_x, new_y):
+        """
+        Dessiner des lignes déjà découpées, comme le ferait multi_cell.
 
+        Paramètres
+        ----------
+        lignes : tuple
+            Les lignes produites par decouper_texte
+        largeur : float
+            Largeur de la cellule
+        hauteur : float
+            Hauteur de chaque ligne
+        bordure : int
+            1 pour encadrer la cellule, 0 sinon
+        align : str
+            Alignement du texte
+        new_x : XPos
+            Position en x après la cellule
+        new_y : YPos
+            Position en y après la cellule
+        """
+        bordure = "LTRB" if bordure == 1 else ""
+        align = Align.coerce(align)
+        y_debut = self.get_y()
+        for index, ligne in enumerate(lignes):
+            derniere = index == len(lignes) - 1
+            nouvelle_page = self._render_styled_text_line(
+                ligne,
+                largeur,
+                h=hauteur,
+                border="".join((
+                    "T" if "T" in bordure and index == 0 else "",
+                    "L" if "L" in bordure else "",
+                    "R" if "R" in bordure else "",
+                    "B" if "B" in bordure and derniere else "",
+                    )),
+                new_x=new_x if derniere else XPos.LEFT,
+                new_y=new_y if derniere else YPos.NEXT,
+                align=align,
+                )
+            if derniere and nouvelle_page and new_y == YPos.TOP:
+                y_debut = self.get_y()
+        if new_y == YPos.TOP:
+            # Revenir en haut de la cellule, sans toucher à x
+            self.y = y_debut
 
     def changer_police(self):
         """
@@ -163,6 +636,7 @@ class FeuilleEvaluation(FPDF):
             new_y=YPos.NEXT,
             markdown=True
             )
+        self.y_contenu = self.get_y()
 
 
     def footer(self):
@@ -185,69 +659,126 @@ class FeuilleEvaluation(FPDF):
             )
 
 
-    def ajouter_critere(self, titre_critere, valeur_critere):
+    def mettre_en_page_rangee(self, titre, valeur, commentaire):
         """
-        Ajouter un critère à la page
+        Calculer la mise en page d'une rangée du tableau, sans rien dessiner.
+        La police courante doit être celle de changer_police.
 
         Paramètres
         ----------
-        titre_critere : str
-            Titre du critère
-        valeur_critere : str
-            Valeur du critère
-        """
+        titre : str
+            Titre du critère ou du commentaire
+        valeur : str
+            Valeur du critère ou texte du commentaire
+        commentaire : bool
+            True pour une rangée de commentaire (titre et texte sur toute la largeur)
 
-         # Générer le titre du critère, si pas de titre, pas de bordure
-        bordure = 1
-        if titre_critere == " ":
-            # Si le champ est vide, ne pas afficher la bordure
-            bordure = 0
+        Retour
+        ------
+        La rangée prête à être dessinée par ecrire_rangee.
+        """
+        valeur = " " if valeur is None else str(valeur)
+
+        if commentaire:
+            largeur = LARGEUR_TITRE + LARGEUR_VALEUR
+            return {
+                "commentaire" : True,
+                "bordure" : 1,
+                "titre" : self.decouper_texte(titre, largeur, markdown=True),
+                "valeur" : self.decouper_texte(valeur, largeur, markdown=True,
+                                               memoriser=False),
+                }
+
+        # Si pas de titre, pas de bordure
+        lignes_titre = self.decouper_texte(titre, LARGEUR_TITRE, markdown=True)
+        # La cellule de la valeur a la même hauteur que celle du titre
+        hauteur = len(lignes_titre) * HAUTEUR_CELLULE
+        crochet = valeur in ("x", "X")
+        # Le crochet est mis en page avec sa propre police, au moment de l'écrire
+        lignes_valeur = None if crochet else self.decouper_texte(valeur, LARGEUR_VALEUR,
+                                                                 memoriser=False)
+        return {
+            "commentaire" : False,
+            "bordure" : 0 if titre == " " else 1,
+            "titre" : lignes_titre,
+            "hauteur" : hauteur,
+            "hauteur_totale" : hauteur * (1 if crochet else len(lignes_valeur)),
+            "crochet" : crochet,
+            "valeur" : lignes_valeur,
+            }
+
+    def ecrire_rangee(self, rangee):
+        """
+        Dessiner une rangée mise en page par mettre_en_page_rangee.
 
-        if valeur_critere is None:
-            valeur_critere = " "
-        else:
-            valeur_critere = str(valeur_critere)
+        Paramètres
+        ----------
+        rangee : dict
+            La rangée à dessiner
+        """
+        hauteur = HAUTEUR_CELLULE*2
+        # Garder un critère entier sur une page lorsqu'il peut y tenir
+        if (not rangee["commentaire"] and
+            rangee["hauteur_totale"] <= self.page_break_trigger - self.y_contenu):
+            hauteur = max(hauteur, rangee["hauteur_totale"])
 
-        if self.will_page_break(HAUTEUR_CELLULE*2):
+        if self.will_page_break(hauteur):
             self.add_page()
 
         self.changer_police()
 
-        old_position = {
-            "x" : self.get_x(),
-            "y" : self.get_y()
-        }
+        if rangee["commentaire"]:
+            largeur = LARGEUR_TITRE + LARGEUR_VALEUR
+            self.ecrire_lignes(rangee["titre"], largeur, HAUTEUR_CELLULE, rangee["bordure"],
+                               'L', XPos.LMARGIN, YPos.NEXT)
+            self.ecrire_lignes(rangee["valeur"], largeur, HAUTEUR_CELLULE, rangee["bordure"],
+                               'L', XPos.LMARGIN, YPos.NEXT)
+            return
 
-        self.multi_cell(
-            w=LARGEUR_TITRE,
-            h=HAUTEUR_CELLULE,
-            txt=titre_critere,
-            border=bordure,
-            align='L',
-            new_x=XPos.RIGHT,
-            new_y=YPos.NEXT,
-            markdown=True
-            )
+        # Le titre laisse le curseur en haut à droite de sa cellule, prêt pour la valeur
+        self.ecrire_lignes(rangee["titre"], LARGEUR_TITRE, HAUTEUR_CELLULE, rangee["bordure"],
+                           'L', XPos.RIGHT, YPos.TOP)
 
-        hauteur_valeur = self.get_y() - old_position["y"]
+        lignes_valeur = rangee["valeur"]
+        if rangee["crochet"]:
+            self.changer_police_crochet()
+            lignes_valeur = self.decouper_texte(CROCHET, LARGEUR_VALEUR)
 
-        # Ajuster la hauteur de la cellule de la valeur pour être identique
-        # à la cellule du titre
-        self.set_xy(old_position["x"] + LARGEUR_TITRE, old_position["y"])
+        self.ecrire_lignes(lignes_valeur, LARGEUR_VALEUR, rangee["hauteur"], rangee["bordure"],
+                           'C', XPos.LMARGIN, YPos.NEXT)
 
-        if valeur_critere in ("x", "X"):
-            valeur_critere = CROCHET
-            self.changer_police_crochet()
+    def ajouter_tableau(self, rangees):
+        """
+        Ajouter les rangées du tableau d'évaluation à la page.
 
-        self.multi_cell(
-            w=LARGEUR_VALEUR,
-            h=hauteur_valeur,
-            txt=valeur_critere,
-            border=bordure,
-            align='C',
-            new_x=XPos.LMARGIN,
-            new_y=YPos.NEXT,
-            )
+        La mise en page de toutes les rangées est calculée d'abord, puis les
+        rangées sont dessinées en une seule passe.
+
+        Paramètres
+        ----------
+        rangees : list
+            Liste de tuples (titre, valeur, commentaire)
+        """
+        self.changer_police()
+        mises_en_page = [
+            self.mettre_en_page_rangee(titre, valeur, commentaire)
+            for titre, valeur, commentaire in rangees
+            ]
+        for rangee in mises_en_page:
+            self.ecrire_rangee(rangee)
+
+    def ajouter_critere(self, titre_critere, valeur_critere):
+        """
+        Ajouter un critère à la page
+
+        Paramètres
+        ----------
+        titre_critere : str
+            Titre du critère
+        valeur_critere : str
+            Valeur du critère
+        """
+        self.ajouter_tableau([(titre_critere, valeur_critere, False)])
 
     def ajouter_commentaire(self, titre, texte):
         """
@@ -260,43 +791,7 @@ class FeuilleEvaluation(FPDF):
         texte : str
             Texte du commentaire
         """
-
-        
-        bordure = 1
-        largeur_totale = LARGEUR_TITRE + LARGEUR_VALEUR
-
-        if texte is None:
-            valeur_critere = " "
-        else:
-            valeur_critere = str(texte)
-
-        if self.will_page_break(HAUTEUR_CELLULE*2):
-            self.add_page()
-
-        self.changer_police()
-
-        self.multi_cell(
-            w=largeur_totale,
-            h=HAUTEUR_CELLULE,
-            txt=titre,
-            border=bordure,
-            align='L',
-            new_x=XPos.LMARGIN,
-            new_y=YPos.NEXT,
-            markdown=True
-            )
-
-        self.multi_cell(
-            w=largeur_totale,
-            h=HAUTEUR_CELLULE,
-            txt=valeur_critere,
-            border=bordure,
-            align='L',
-            new_x=XPos.LMARGIN,
-            new_y=YPos.NEXT,
-            markdown=True
-            )
-
+        self.ajouter_tableau([(titre, texte, True)])
 
 
 def affiche_aide():
@@ -306,16 +801,27 @@ def affiche_aide():
 
     print("")
     print(f"""
-    retroaction.py -i <fichier_retro> -o <dossier_sortie> -s <nom_feuille> -d <denominateur> -p
+    retroaction.py -i <fichier_retro> -o <dossier_sortie> -s <nom_feuille> -d <denominateur> -p -j <processus> -z -f --profile -b --watch --compression <methode> --compression-level <niveau>
+    retroaction.py --serve --port <port> --max-concurrent <traitements> -j <processus>
 
-    -i : Le chiffrier Excel contenant les rétroactions aux élèves. Chaque élément de la grille d'évaluation est en ligne et chaque élève est une colonne. Relatif au répertoire courant.
+    -i : Le chiffrier Excel (.xlsx) ou le fichier CSV (.csv) contenant les rétroactions aux élèves. Chaque élément de la grille d'évaluation est en ligne et chaque élève est une colonne. Relatif au répertoire courant.
     -o : Le dossier dans lequel seront créés les pdf et l'archive zip.  Relatif au répertoire courant.
-    -s : Le nom de la feuille contenant les rétroactions aux élèves.
+    -s : Le nom de la feuille contenant les rétroactions aux élèves. Pour un fichier CSV, le nom du sommaire (le nom du fichier par défaut).
     -d : Le dénominateur de la note de l'évaluation.
     -p : Exécution partielle avec une sélection en utilisant le critère {LIBELLE_SELECTION}
+    -j, --jobs : Le nombre de processus qui génèrent les PDF en parallèle (1 par défaut).
+    -z, --zip-only : Écrire seulement l'archive zip, sans les PDF individuels.
+    -f, --force : Générer tous les PDF, même ceux qui n'ont pas changé depuis la dernière exécution.
+    --profile : Mesurer la durée et la mémoire de chaque phase et écrire le rapport {NOM_PROFIL} à côté de travaux.zip.
+    --compression : La compression des PDF dans travaux.zip : stored, deflated (par défaut) ou bzip2.
+    --compression-level : Le niveau de compression, 0 à 9 pour deflated (6 par défaut), 1 à 9 pour bzip2.
+    --watch : Rester actif et générer à nouveau les fiches modifiées à chaque enregistrement du chiffrier.
+    --serve : Démarrer le service HTTP local sur {HOTE_SERVICE} (port {PORT_SERVICE} par défaut, --port pour le changer). POST /retroaction?feuille=...&denominateur=...&titre=... avec le chiffrier comme corps renvoie une archive avec travaux.zip et le sommaire ; GET /metriques renvoie les latences.
+    --max-concurrent : Le nombre de chiffriers traités en même temps par le service ({NOMBRE_TRAVAUX_SIMULTANES} par défaut), les autres requêtes reçoivent 503.
+    -b, --batch : Traiter toutes les feuilles du chiffrier -i, ou de tous les chiffriers si -i est un dossier, chacune dans son sous-dossier de -o. -s devient un motif de noms de feuilles (* par défaut) et -t est le nom de chaque feuille s'il est absent.
     """)
 
-def traiter_eleve(dossier_sortie, eleve, titre_feuille):
+def traiter_eleve(dossier_sortie, eleve, titre_feuille, ecrire_pdf=True):
     """
         Créer le PDF pour un élève.
 
@@ -327,10 +833,12 @@ def traiter_eleve(dossier_sortie, eleve, titre_feuille):
             Objet représentant un élève
         titre_feuille : str
             Titre du document généré
+        ecrire_pdf : bool
+            False pour garder le PDF en mémoire seulement, sans l'écrire sur disque.
         Retour
         ------
-        nom_pdf : str
-            Le nom du pdf créé
+        contenu : bytes
+            Le contenu du pdf créé, None si le PDF n'a pas pu être généré
     """
     # Créer le PDF
     pdf = FeuilleEvaluation(titre_feuille)
@@ -338,203 +846,1057 @@ def traiter_eleve(dossier_sortie, eleve, titre_feuille):
     pdf.set_fill_color(r=255, g=255, b=255)
 
     # Imprimer les informations de l'élève
-    pdf.ajouter_critere(LIBELLE_DA, eleve.numero_da)
-    pdf.ajouter_critere(LIBELLE_NOM, eleve.nom)
-    pdf.ajouter_critere(LIBELLE_PRENOM, eleve.prenom)
-    pdf.ajouter_critere(LIBELLE_NOTES, eleve.afficher_note())
-    pdf.ajouter_commentaire(LIBELLE_COMMENTAIRES, eleve.commentaires)
+    rangees = [
+        (LIBELLE_DA, eleve.numero_da, False),
+        (LIBELLE_NOM, eleve.nom, False),
+        (LIBELLE_PRENOM, eleve.prenom, False),
+        (LIBELLE_NOTES, eleve.afficher_note(), False),
+        (LIBELLE_COMMENTAIRES, eleve.commentaires, True),
+        ]
 
     # Traiter tous les critères de correction pour l'élève
-    for ligne in eleve.notes:
-        if '{texte}' in ligne[0]:
-            titre = ligne[0].replace('{texte}', '')
-            pdf.ajouter_commentaire(titre, ligne[1])
-        else:
-            pdf.ajouter_critere(ligne[0], ligne[1])
+    rangees.extend(eleve.grille.rangees(eleve.valeurs))
 
-    # Écrire le PDF sur disque
+    pdf.ajouter_tableau(rangees)
+
+    # Générer le PDF en mémoire
     nom_pdf = os.path.join(dossier_sortie, eleve.nom_pdf())
     try:
-        pdf.output(name=nom_pdf)
+        contenu = bytes(pdf.output())
     except UnicodeEncodeError as erreur:
         print("Une erreur d'encodage du PDF lors de l'écriture du PDF suivant : ")
         print(nom_pdf)
         print(erreur)
+        return None
 
-    return nom_pdf
-
-
-def trouver_lignes_criteres(feuille_a_traiter):
-    """
-    Paramètres
-    ----------
-    feuille_a_traiter : objet data_sheet
-        La feuille Excel qui contient les rétroactions à traiter pour l'élève.
-
-    Retour
-    ------
-    La liste des critères et leur ligne dans la feuille.
-    """
-
-    # Définir les critères à transférer
-    criteres = {
-        LIBELLE_NOM : 0,
-        LIBELLE_PRENOM : 0,
-        LIBELLE_DA : 0,
-        LIBELLE_NOTES : 0,
-        LIBELLE_SELECTION : 0,
-        LIBELLE_COMMENTAIRES : 0,
-        }
+    # Écrire le PDF sur disque
+    if ecrire_pdf:
+        ecrire_fiche(dossier_sortie, eleve, contenu)
 
-    # Trouver la ligne correspondante aux critères
-    for cle, _ in criteres.items():
-        for ligne in range(1, feuille_a_traiter.max_row + 1):
-            if feuille_a_traiter.cell(column=1, row=ligne).value == cle:
-                criteres[cle] = ligne
-    return criteres
+    return contenu
 
 
-def sommaire_notes(eleves, dossier_sortie, denominateur, nom_feuille_a_traiter):
+def ecrire_fiche(dossier_sortie, eleve, contenu):
     """
-        Écrire un chiffrier Excel avec la liste des DA et des notes
+        Écrire le PDF d'un élève sur disque.
 
         Paramètres
         ----------
-        feuille_a_traiter : objet data_sheet
-            La feuille Excel qui contient les rétroactions à traiter pour l'élève.
         dossier_sortie : str
             Chemin sur disque du dossier qui recevra le PDF
-        nom_feuille_a_traiter : str
-            Le nom de la feuille Excel qui contient les rétroactions à traiter pour l'élève.
-        denominateur : int
-            Le dénominateur de la note totale
+        eleve : Eleve
+            Objet représentant un élève
+        contenu : bytes
+            Le contenu du PDF
     """
+    with open(os.path.join(dossier_sortie, eleve.nom_pdf()), "wb") as fichier_pdf:
+        fichier_pdf.write(contenu)
 
-    # Créer le chiffrier
-    chiffrier = openpyxl.Workbook()
-    feuille = chiffrier[chiffrier.sheetnames[0]]
-
-    # Écrire les entêtes
-    feuille.cell(row=1, column=1).value = LIBELLE_NOM
-    feuille.cell(row=1, column=2).value = LIBELLE_PRENOM
-    feuille.cell(row=1, column=3).value = LIBELLE_DA
-    feuille.cell(row=1, column=4).value = f'Note sur {denominateur}'
-    feuille.cell(row=1, column=5).value = 'Note sur 100'
-    feuille.cell(row=1, column=6).value = 'Échec'
-
-    ligne = 1
-    for eleve in eleves:
-        # Écrire les informations de l'élève
-        ligne += 1
-        feuille.cell(row=ligne, column=1).value = eleve.nom
-        feuille.cell(row=ligne, column=2).value = eleve.prenom
-        feuille.cell(row=ligne, column=3).value = eleve.numero_da
-        feuille.cell(row=ligne, column=4).value = eleve.note
-        feuille.cell(row=ligne, column=5).value = eleve.note_sur_100()
-        feuille.cell(row=ligne, column=6).value = "Echec" if eleve.echec() else ""
 
-    chiffrier.save(filename=f"{dossier_sortie}/{nom_feuille_a_traiter}.xlsx")
+def lire_feuille(fichier_retroaction, nom_feuille_a_traiter):
+    """
+    Lire une feuille du chiffrier en une seule passe, avec le lecteur de son extension.
 
+    Paramètres
+    ----------
+    fichier_retroaction : str
+        Chemin du fichier Excel ou CSV qui contient les rétroactions à traiter.
+    nom_feuille_a_traiter : str
+        Le nom de la feuille Excel qui contient les rétroactions à traiter pour l'élève.
 
-def generer_liste_eleves(fichier_retroaction,
-                        nom_feuille_a_traiter,
-                        denominateur,
-                        traitement_partiel):
+    Retour
+    ------
+    La feuille sous forme de liste de lignes (listes de valeurs de même longueur).
+    Lève KeyError si la feuille n'existe pas.
     """
-        Désérialisation du chiffrier Excel en une liste d'objets de type Eleve
+    return ouvrir_lecteur(fichier_retroaction).lire_feuille(nom_feuille_a_traiter)
 
-        Paramètres
-        ----------
-        fichier_retroaction : str
-            Chemin du fichier Excel qui contient les rétroactions à traiter.
-        nom_feuille_a_traiter : str
-            Le nom de la feuille Excel qui contient les rétroactions à traiter pour l'élève.
-        denominateur : int
-            Le dénominateur de la note totale
-        traitement_partiel : bool
-            True si on doit traiter les rétroactions partiellement, False sinon.
+
+def lire_lignes(lignes_lues):
     """
-    # Ouvrir le chiffrier
-    chiffrier = openpyxl.load_workbook(fichier_retroaction, data_only=True)
-    feuille = chiffrier[nom_feuille_a_traiter]
+    Rassembler les lignes d'une feuille dans une grille.
 
-    # Définir les critères à transférer
-    criteres = trouver_lignes_criteres(feuille)
+    Paramètres
+    ----------
+    lignes_lues : iterable
+        Les lignes de la feuille, des séquences de valeurs de longueurs variables
 
-    # Créer la liste des élèves
-    eleves = []
+    Retour
+    ------
+    La feuille sous forme de liste de lignes (listes de valeurs de même longueur).
+    """
+    lignes = [list(ligne) for ligne in lignes_lues]
 
-    # Traiter chaque étudiant
-    for etudiant in range(2, feuille.max_column + 1):
-        # Vérifier si le traitement partiel sélectionné est activé
-        if (traitement_partiel and
-            feuille.cell(column=etudiant, row=criteres[LIBELLE_SELECTION]).value != "X"):
-            continue
+    # Uniformiser la longueur des lignes pour un accès direct par colonne
+    largeur = max((len(ligne) for ligne in lignes), default=0)
+    for ligne in lignes:
+        ligne.extend([None] * (largeur - len(ligne)))
+    return lignes
 
-        # Créer un objet élève
-        eleve = Eleve()
 
-        # Définir les valeurs
-        eleve.nom = feuille.cell(column=etudiant, row=criteres[LIBELLE_NOM]).value
-        eleve.prenom = feuille.cell(column=etudiant, row=criteres[LIBELLE_PRENOM]).value
-        eleve.numero_da = str(feuille.cell(column=etudiant, row=criteres[LIBELLE_DA]).value)
-        eleve.note = int(feuille.cell(column=etudiant, row=criteres[LIBELLE_NOTES]).value)
-        eleve.commentaires = feuille.cell(column=etudiant, row=criteres[LIBELLE_COMMENTAIRES]).value
-        eleve.denominateur = denominateur
+def iterer_feuilles(fichier_retroaction, motif_feuille="*"):
+    """
+    Lire une à une les feuilles d'un chiffrier, en ne l'ouvrant qu'une seule fois.
 
-        for element in range(criteres[LIBELLE_PRENOM] + 1, feuille.max_row + 1):
+    Paramètres
+    ----------
+    fichier_retroaction : str
+        Chemin du fichier Excel ou CSV qui contient les rétroactions à traiter.
+    motif_feuille : str
+        Motif (fnmatch) des noms de feuilles à lire, toutes par défaut.
 
-            titre_critere = feuille.cell(column=1, row=element).value
-            if titre_critere is None:
-                titre_critere = " "
+    Retour
+    ------
+    Un générateur de tuples (nom de la feuille, lignes lues par lire_lignes).
+    """
+    return ouvrir_lecteur(fichier_retroaction).iterer_feuilles(motif_feuille)
 
-            valeur_critere = feuille.cell(column=etudiant, row=element).value
-            if valeur_critere is None:
-                valeur_critere = " "
 
-            eleve.ajout_note(titre_critere, valeur_critere)
+class LecteurChiffrier(abc.ABC):
+    """
+    Lecteur d'un fichier de rétroactions, qui renvoie chaque feuille sous forme
+    de grille (voir lire_lignes). Le lecteur est choisi selon l'extension du
+    fichier par ouvrir_lecteur.
+    """
+    extensions = ()
+    # True si le fichier ne contient qu'une feuille, qui accepte n'importe quel nom
+    feuille_unique = False
 
-        # Ajouter l'élève à la liste
-        eleves.append(eleve)
+    def __init__(self, fichier_retroaction):
+        """
+            Initialiser le lecteur.
 
-    chiffrier.close()
-    # Retourner la liste des élèves
-    return eleves
+            Paramètres
+            ----------
+            fichier_retroaction : str
+                Chemin du fichier à lire
+        """
+        self.fichier_retroaction = fichier_retroaction
 
+    @abc.abstractmethod
+    def noms_feuilles(self):
+        """
+            Renvoyer la liste des noms des feuilles du fichier.
+        """
 
-def traiter_eleves(eleves, dossier_sortie, titre_feuille):
-    """
-    Traiter tous les élèves de la liste
+    @abc.abstractmethod
+    def lire_feuille(self, nom_feuille):
+        """
+            Lire une feuille. Lève KeyError si la feuille n'existe pas.
 
-    Paramètres
-    ----------
-    eleves : list
-        La liste des élèves à traiter
+            Paramètres
+            ----------
+            nom_feuille : str
+                Le nom de la feuille à lire
+        """
 
-    dossier_sortie : str
-        Chemin du dossier qui recevra les fichiers PDF
+    def iterer_feuilles(self, motif_feuille="*"):
+        """
+            Lire une à une les feuilles dont le nom correspond au motif.
 
-    titre_feuille : str
+            Paramètres
+            ----------
+            motif_feuille : str
+                Motif (fnmatch) des noms de feuilles à lire
+        """
+        for nom_feuille in self.noms_feuilles():
+            if fnmatchcase(nom_feuille, motif_feuille):
+                yield nom_feuille, self.lire_feuille(nom_feuille)
+
+
+class LecteurExcel(LecteurChiffrier):
+    """
+    Lecteur des chiffriers Excel, avec openpyxl en mode lecture seule
+    """
+    extensions = (".xlsx", ".xlsm")
+
+    def noms_feuilles(self):
+        # Lire seulement la liste des feuilles de xl/workbook.xml, sans charger
+        # les chaînes partagées, les styles ni les cellules
+        with ZipFile(self.fichier_retroaction) as archive:
+            try:
+                classeur = archive.open("xl/workbook.xml")
+            except KeyError as erreur:
+                raise BadZipFile("xl/workbook.xml absent") from erreur
+            with classeur:
+                return [element.get("name")
+                        for _, element in ElementTree.iterparse(classeur)
+                        if element.tag.endswith("}sheet")]
+
+    def ouvrir_chiffrier(self):
+        """
+            Ouvrir le chiffrier en lecture seule. Un zip qui n'est pas un chiffrier
+            lève BadZipFile, comme dans noms_feuilles.
+        """
+        try:
+            return openpyxl.load_workbook(self.fichier_retroaction, read_only=True,
+                                          data_only=True)
+        except (KeyError, InvalidFileException) as erreur:
+            raise BadZipFile(f"{self.fichier_retroaction} n'est pas un chiffrier") from erreur
+
+    def lire_feuille(self, nom_feuille):
+        if nom_feuille not in self.noms_feuilles():
+            raise KeyError(nom_feuille)
+        chiffrier = self.ouvrir_chiffrier()
+        try:
+            return lire_lignes(chiffrier[nom_feuille].iter_rows(values_only=True))
+        finally:
+            chiffrier.close()
+
+    def iterer_feuilles(self, motif_feuille="*"):
+        # Le chiffrier n'est ouvert qu'une fois pour toutes ses feuilles
+        chiffrier = self.ouvrir_chiffrier()
+        try:
+            for nom_feuille in chiffrier.sheetnames:
+                if fnmatchcase(nom_feuille, motif_feuille):
+                    yield nom_feuille, lire_lignes(
+                        chiffrier[nom_feuille].iter_rows(values_only=True))
+        finally:
+            chiffrier.close()
+
+
+class LecteurCsv(LecteurChiffrier):
+    """
+    Lecteur des fichiers CSV exportés d'Excel, séparés par des points-virgules,
+    des virgules ou des tabulations. Le fichier est une seule feuille, nommée
+    d'après le fichier.
+
+    Les nombres sont convertis comme openpyxl les lirait : une même grille
+    donne les mêmes fiches qu'elle soit lue d'un chiffrier Excel ou d'un CSV.
+    Les cellules vides deviennent None.
+    """
+    extensions = (".csv",)
+    feuille_unique = True
+
+    def noms_feuilles(self):
+        return [Path(self.fichier_retroaction).stem]
+
+    def lire_feuille(self, nom_feuille):
+        texte = self.lire_texte()
+        delimiteur = self.trouver_delimiteur(texte)
+        lecteur = csv.reader(io.StringIO(texte, newline=""), delimiter=delimiteur)
+        return lire_lignes(
+            [convertir_valeur_csv(valeur, delimiteur != ",") for valeur in ligne]
+            for ligne in lecteur)
+
+    def lire_texte(self):
+        """
+            Lire le fichier en UTF-8 (avec ou sans BOM), sinon en Windows-1252,
+            l'encodage des exportations CSV d'Excel sous Windows.
+        """
+        with open(self.fichier_retroaction, "rb") as fichier:
+            contenu = fichier.read()
+        try:
+            return contenu.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            return contenu.decode("cp1252")
+
+    @staticmethod
+    def trouver_delimiteur(texte):
+        """
+            Trouver le délimiteur du fichier : point-virgule, virgule ou tabulation.
+
+            Paramètres
+            ----------
+            texte : str
+                Le contenu du fichier
+        """
+        try:
+            return csv.Sniffer().sniff(texte[:64 * 1024], delimiters=";,\t").delimiter
+        except csv.Error:
+            premiere_ligne = texte.split("\n", 1)[0]
+            return max(";,\t", key=premiere_ligne.count)
+
+
+def convertir_valeur_csv(valeur, virgule_decimale):
+    """
+    Convertir une cellule CSV comme openpyxl lirait la cellule Excel équivalente.
+
+    Paramètres
+    ----------
+    valeur : str
+        Le texte de la cellule
+    virgule_decimale : bool
+        True si la virgule peut être le séparateur décimal (délimiteur autre que la virgule)
+
+    Retour
+    ------
+    None pour une cellule vide, un int ou un float pour un nombre, le texte sinon.
+    Les nombres écrits avec des zéros en tête, comme un DA, restent du texte.
+    """
+    if valeur == "":
+        return None
+    nombre = valeur.replace(",", ".", 1) if virgule_decimale else valeur
+    if MOTIF_ENTIER_CSV.fullmatch(nombre):
+        return int(nombre)
+    if MOTIF_DECIMAL_CSV.fullmatch(nombre):
+        return float(nombre)
+    return valeur
+
+
+def ouvrir_lecteur(fichier_retroaction):
+    """
+    Renvoyer le lecteur qui correspond à l'extension du fichier, le lecteur
+    Excel par défaut.
+
+    Paramètres
+    ----------
+    fichier_retroaction : str
+        Chemin du fichier qui contient les rétroactions à traiter.
+    """
+    extension = Path(fichier_retroaction).suffix.lower()
+    for lecteur in LECTEURS:
+        if extension in lecteur.extensions:
+            return lecteur(fichier_retroaction)
+    return LecteurExcel(fichier_retroaction)
+
+
+LECTEURS = (LecteurExcel, LecteurCsv)
+# Extensions des fichiers de rétroactions reconnus
+EXTENSIONS_CHIFFRIERS = tuple(extension for lecteur in LECTEURS
+                              for extension in lecteur.extensions)
+
+
+def indexer_libelles(feuille_a_traiter):
+    """
+    Lire la colonne A une seule fois et associer chaque libellé à ses lignes.
+
+    Paramètres
+    ----------
+    feuille_a_traiter : list
+        La feuille lue par lire_feuille qui contient les rétroactions à traiter pour l'élève.
+
+    Retour
+    ------
+    Un dictionnaire libellé -> liste des lignes (à partir de 1) où il apparaît.
+    """
+    index = {}
+    for ligne, valeurs in enumerate(feuille_a_traiter, start=1):
+        if valeurs and valeurs[0] is not None:
+            index.setdefault(valeurs[0], []).append(ligne)
+    return index
+
+
+def trouver_lignes_criteres(feuille_a_traiter, index=None):
+    """
+    Paramètres
+    ----------
+    feuille_a_traiter : list
+        La feuille lue par lire_feuille qui contient les rétroactions à traiter pour l'élève.
+    index : dict
+        L'index des libellés produit par indexer_libelles, s'il est déjà calculé.
+
+    Retour
+    ------
+    La liste des critères et leur ligne dans la feuille (0 si le critère est absent).
+    """
+    if index is None:
+        index = indexer_libelles(feuille_a_traiter)
+
+    # Si un libellé est en double, la dernière ligne l'emporte
+    return {cle : index.get(cle, [0])[-1] for cle in LIBELLES_CRITERES}
+
+
+def trouver_libelles_doubles(index):
+    """
+    Paramètres
+    ----------
+    index : dict
+        L'index des libellés produit par indexer_libelles.
+
+    Retour
+    ------
+    Les critères présents sur plus d'une ligne et leurs lignes.
+    """
+    return {cle : index[cle] for cle in LIBELLES_CRITERES if len(index.get(cle, [])) > 1}
+
+
+def ligne_sommaire(eleve):
+    """
+        Renvoyer la ligne du sommaire des notes pour un élève.
+
+        Paramètres
+        ----------
+        eleve : Eleve
+            Objet représentant un élève
+
+        Retour
+        ------
+        Le tuple (nom, prénom, DA, note, note sur 100, échec).
+    """
+    return (eleve.nom, eleve.prenom, eleve.numero_da, eleve.note,
+            eleve.note_sur_100(), eleve.echec())
+
+
+def sommaire_notes(eleves, dossier_sortie, denominateur, nom_feuille_a_traiter):
+    """
+        Écrire un chiffrier Excel avec la liste des DA et des notes
+
+        Paramètres
+        ----------
+        eleves : list
+            La liste des élèves traités
+        dossier_sortie : str
+            Chemin sur disque du dossier qui recevra le PDF
+        nom_feuille_a_traiter : str
+            Le nom de la feuille Excel qui contient les rétroactions à traiter pour l'élève.
+        denominateur : int
+            Le dénominateur de la note totale
+    """
+    ecrire_sommaire([ligne_sommaire(eleve) for eleve in eleves], dossier_sortie,
+                    denominateur, nom_feuille_a_traiter)
+
+
+def ecrire_sommaire(lignes, dossier_sortie, denominateur, nom_feuille_a_traiter):
+    """
+        Écrire un chiffrier Excel avec les lignes du sommaire des notes
+
+        Paramètres
+        ----------
+        lignes : list
+            Les lignes produites par ligne_sommaire
+        dossier_sortie : str
+            Chemin sur disque du dossier qui recevra le PDF
+        nom_feuille_a_traiter : str
+            Le nom de la feuille Excel qui contient les rétroactions à traiter pour l'élève.
+        denominateur : int
+            Le dénominateur de la note totale
+    """
+
+    # Créer le chiffrier, écrit rangée par rangée
+    chiffrier = openpyxl.Workbook(write_only=True)
+    feuille = chiffrier.create_sheet()
+
+    # Écrire les entêtes
+    feuille.append([
+        LIBELLE_NOM,
+        LIBELLE_PRENOM,
+        LIBELLE_DA,
+        f'Note sur {denominateur}',
+        'Note sur 100',
+        'Échec',
+        ])
+
+    for nom, prenom, numero_da, note, note_sur_100, echec in lignes:
+        # Écrire les informations de l'élève
+        feuille.append([nom, prenom, numero_da, note, note_sur_100, "Echec" if echec else ""])
+
+    # Écrire les statistiques du groupe
+    statistiques = calculer_statistiques(lignes)
+    feuille_statistiques = chiffrier.create_sheet(FEUILLE_STATISTIQUES)
+    feuille_statistiques.append(['Statistique', f'Note sur {denominateur}', 'Note sur 100'])
+    feuille_statistiques.append(["Nombre d'élèves", statistiques["nombre"]])
+    if statistiques["nombre"]:
+        for libelle, cle in (("Moyenne", "moyenne"),
+                             ("Médiane", "mediane"),
+                             ("Écart type", "ecart_type")):
+            feuille_statistiques.append([libelle, statistiques[cle],
+                                         statistiques[f"{cle}_sur_100"]])
+        taux_echec = WriteOnlyCell(feuille_statistiques, value=statistiques["taux_echec"])
+        taux_echec.number_format = '0.0 %'
+        feuille_statistiques.append(["Taux d'échec", taux_echec])
+
+    feuille_statistiques.append([])
+    feuille_statistiques.append(['Note sur 100', "Nombre d'élèves"])
+    for borne, nombre in zip(range(0, 100, LARGEUR_CLASSE_HISTOGRAMME),
+                             statistiques["histogramme"]):
+        fin = borne + LARGEUR_CLASSE_HISTOGRAMME - 1
+        if fin == 99:
+            fin = 100
+        feuille_statistiques.append([f"{borne} - {fin}", nombre])
+
+    chiffrier.save(filename=f"{dossier_sortie}/{nom_feuille_a_traiter}.xlsx")
+
+
+def calculer_statistiques(lignes):
+    """
+        Calculer les statistiques du groupe à partir des lignes du sommaire.
+        Le module statistics fait une passe par statistique, ce qui reste
+        négligeable pour la taille d'un groupe.
+
+        Paramètres
+        ----------
+        lignes : list
+            Les lignes produites par ligne_sommaire
+
+        Retour
+        ------
+        Un dictionnaire avec le nombre d'élèves, la moyenne, la médiane et l'écart
+        type des notes (brutes et sur 100), le taux d'échec et l'histogramme des
+        notes sur 100.
+    """
+    notes = [ligne[3] for ligne in lignes]
+    notes_sur_100 = [ligne[4] for ligne in lignes]
+
+    # Une classe par tranche de LARGEUR_CLASSE_HISTOGRAMME, 100 dans la dernière
+    histogramme = [0] * (100 // LARGEUR_CLASSE_HISTOGRAMME)
+    for note_sur_100 in notes_sur_100:
+        classe = min(max(int(note_sur_100), 0) // LARGEUR_CLASSE_HISTOGRAMME,
+                     len(histogramme) - 1)
+        histogramme[classe] += 1
+
+    statistiques = {
+        "nombre" : len(lignes),
+        "histogramme" : histogramme,
+        }
+    if lignes:
+        statistiques.update({
+            "moyenne" : statistics.fmean(notes),
+            "moyenne_sur_100" : statistics.fmean(notes_sur_100),
+            "mediane" : statistics.median(notes),
+            "mediane_sur_100" : statistics.median(notes_sur_100),
+            "ecart_type" : statistics.pstdev(notes),
+            "ecart_type_sur_100" : statistics.pstdev(notes_sur_100),
+            "taux_echec" : sum(1 for ligne in lignes if ligne[5]) / len(lignes),
+            })
+    return statistiques
+
+
+def generer_liste_eleves(feuille,
+                        denominateur,
+                        traitement_partiel,
+                        criteres=None):
+    """
+        Désérialisation de la feuille Excel en une liste d'objets de type Eleve
+
+        Paramètres
+        ----------
+        feuille : list
+            La feuille lue par lire_feuille qui contient les rétroactions à traiter.
+        denominateur : int
+            Le dénominateur de la note totale
+        traitement_partiel : bool
+            True si on doit traiter les rétroactions partiellement, False sinon.
+        criteres : dict
+            Les lignes des critères déjà trouvées par trouver_lignes_criteres, si disponibles.
+    """
+    return list(iterer_eleves(feuille, denominateur, traitement_partiel, criteres))
+
+
+def compter_eleves(feuille, traitement_partiel, criteres):
+    """
+        Compter les élèves à traiter sans les désérialiser.
+
+        Paramètres
+        ----------
+        feuille : list
+            La feuille lue par lire_feuille qui contient les rétroactions à traiter.
+        traitement_partiel : bool
+            True si on doit traiter les rétroactions partiellement, False sinon.
+        criteres : dict
+            Les lignes des critères trouvées par trouver_lignes_criteres.
+    """
+    if not feuille:
+        return 0
+    if not traitement_partiel:
+        return len(feuille[0]) - 1
+    return sum(1 for valeur in feuille[criteres[LIBELLE_SELECTION] - 1][1:] if valeur == "X")
+
+
+def iterer_eleves(feuille,
+                  denominateur,
+                  traitement_partiel,
+                  criteres=None):
+    """
+        Désérialisation de la feuille Excel, un objet Eleve à la fois
+
+        Paramètres
+        ----------
+        feuille : list
+            La feuille lue par lire_feuille qui contient les rétroactions à traiter.
+        denominateur : int
+            Le dénominateur de la note totale
+        traitement_partiel : bool
+            True si on doit traiter les rétroactions partiellement, False sinon.
+        criteres : dict
+            Les lignes des critères déjà trouvées par trouver_lignes_criteres, si disponibles.
+    """
+    # Définir les critères à transférer
+    if criteres is None:
+        criteres = trouver_lignes_criteres(feuille)
+
+    def valeur(ligne, colonne):
+        return feuille[ligne - 1][colonne - 1]
+
+    # Les critères de correction suivent la ligne du prénom
+    lignes_notes = feuille[criteres[LIBELLE_PRENOM]:]
+    grille = Grille(
+        (" " if ligne[0] is None else ligne[0] for ligne in lignes_notes),
+        criteres
+        )
+
+    nombre_colonnes = len(feuille[0]) if feuille else 0
+
+    # Traiter chaque étudiant
+    for etudiant in range(2, nombre_colonnes + 1):
+        # Vérifier si le traitement partiel sélectionné est activé
+        if (traitement_partiel and
+            valeur(criteres[LIBELLE_SELECTION], etudiant) != "X"):
+            continue
+
+        # Créer un objet élève
+        eleve = Eleve(grille=grille)
+
+        # Définir les valeurs
+        eleve.nom = valeur(criteres[LIBELLE_NOM], etudiant)
+        eleve.prenom = valeur(criteres[LIBELLE_PRENOM], etudiant)
+        eleve.numero_da = str(valeur(criteres[LIBELLE_DA], etudiant))
+        eleve.note = int(valeur(criteres[LIBELLE_NOTES], etudiant))
+        eleve.commentaires = valeur(criteres[LIBELLE_COMMENTAIRES], etudiant)
+        eleve.denominateur = denominateur
+        eleve.valeurs = tuple(
+            " " if ligne[etudiant - 1] is None else ligne[etudiant - 1]
+            for ligne in lignes_notes
+            )
+
+        yield eleve
+
+
+def compresser_membre(contenu, compression=COMPRESSION_ZIP):
+    """
+        Compresser un PDF comme ZipFile le ferait, pour l'ajouter tel quel à l'archive.
+
+        Paramètres
+        ----------
+        contenu : bytes
+            Le contenu du PDF
+        compression : tuple
+            La méthode (ZIP_STORED, ZIP_DEFLATED ou ZIP_BZIP2) et le niveau de
+            compression, None pour le niveau par défaut de la méthode
+
+        Retour
+        ------
+        Le tuple (données compressées, CRC-32, taille non compressée).
+    """
+    methode, niveau = compression
+    if methode == ZIP_DEFLATED:
+        compresseur = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if niveau is None else niveau,
+                                       zlib.DEFLATED, -15)
+        donnees = compresseur.compress(contenu) + compresseur.flush()
+    elif methode == ZIP_BZIP2:
+        donnees = bz2.compress(contenu, 9 if niveau is None else niveau)
+    else:
+        donnees = contenu
+    return donnees, zlib.crc32(contenu), len(contenu)
+
+
+def ajouter_membre(fichier_zip, nom, membre, methode):
+    """
+        Ajouter à l'archive un membre déjà compressé par compresser_membre.
+
+        ZipFile ne sait écrire que des données qu'il compresse lui-même : l'en-tête
+        est écrit comme le fait ZipFile.mkdir, suivi des données compressées.
+
+        Paramètres
+        ----------
+        fichier_zip : ZipFile
+            L'archive ouverte en écriture
+        nom : str
+            Le nom du membre dans l'archive
+        membre : tuple
+            Le tuple renvoyé par compresser_membre
+        methode : int
+            La méthode utilisée par compresser_membre
+    """
+    # pylint: disable=protected-access
+    donnees, crc, taille = membre
+    info = ZipInfo(nom, time.localtime(time.time())[:6])
+    info.compress_type = methode
+    info.external_attr = 0o600 << 16
+    info.CRC = crc
+    info.file_size = taille
+    info.compress_size = len(donnees)
+    with fichier_zip._lock:
+        if fichier_zip._seekable:
+            fichier_zip.fp.seek(fichier_zip.start_dir)
+        info.header_offset = fichier_zip.fp.tell()
+        fichier_zip._writecheck(info)
+        fichier_zip._didModify = True
+        fichier_zip.filelist.append(info)
+        fichier_zip.NameToInfo[info.filename] = info
+        fichier_zip.fp.write(info.FileHeader())
+        fichier_zip.fp.write(donnees)
+        fichier_zip.start_dir = fichier_zip.fp.tell()
+
+
+def traiter_eleve_chronometre(dossier_sortie, eleve, titre_feuille, ecrire_pdf,
+                              compression=COMPRESSION_ZIP):
+    """
+        Créer, écrire et compresser le PDF pour un élève en mesurant chaque étape.
+
+        Retour
+        ------
+        membre : tuple
+            Le pdf créé et compressé (voir compresser_membre), None si le PDF n'a
+            pas pu être généré
+        durees : tuple
+            Les durées du rendu du PDF, de son écriture sur disque et de sa
+            compression, en secondes
+    """
+    debut = time.perf_counter()
+    contenu = traiter_eleve(dossier_sortie, eleve, titre_feuille, False)
+    duree_rendu = time.perf_counter() - debut
+    if contenu is None:
+        return None, (duree_rendu, 0.0, 0.0)
+
+    debut = time.perf_counter()
+    if ecrire_pdf:
+        ecrire_fiche(dossier_sortie, eleve, contenu)
+    duree_ecriture = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    membre = compresser_membre(contenu, compression)
+    return membre, (duree_rendu, duree_ecriture, time.perf_counter() - debut)
+
+
+def traiter_lot_processus(dossier_sortie, eleves, titre_feuille, ecrire_pdf,
+                          compression=COMPRESSION_ZIP):
+    """
+        Créer et compresser les PDF d'un lot d'élèves dans un processus de travail.
+
+        La sortie console est capturée pour être réaffichée par le processus
+        principal dans l'ordre des élèves.
+
+        Retour
+        ------
+        Pour chaque élève du lot, le tuple (membre, durees, sortie) :
+        membre : tuple
+            Le pdf créé et compressé (voir compresser_membre), None si le PDF n'a
+            pas pu être généré
+        durees : tuple
+            Les durées du rendu, de l'écriture et de la compression du PDF, en secondes
+        sortie : str
+            Les messages affichés pendant la création du PDF
+    """
+    resultats = []
+    for eleve in eleves:
+        sortie = io.StringIO()
+        with redirect_stdout(sortie):
+            membre, durees = traiter_eleve_chronometre(dossier_sortie, eleve, titre_feuille,
+                                                       ecrire_pdf, compression)
+        resultats.append((membre, durees, sortie.getvalue()))
+    return resultats
+
+
+def lire_manifeste(dossier_sortie):
+    """
+    Lire le manifeste des fiches déjà générées dans le dossier de sortie.
+
+    Paramètres
+    ----------
+    dossier_sortie : str
+        Chemin du dossier qui contient les fichiers PDF
+
+    Retour
+    ------
+    Un dictionnaire nom du PDF -> empreinte, vide si le manifeste est absent ou illisible.
+    """
+    try:
+        with open(os.path.join(dossier_sortie, NOM_MANIFESTE), encoding="utf-8") as fichier:
+            manifeste = json.load(fichier)
+    except (OSError, ValueError):
+        return {}
+    return manifeste if isinstance(manifeste, dict) else {}
+
+
+def ecrire_manifeste(dossier_sortie, manifeste):
+    """
+    Écrire le manifeste des fiches générées dans le dossier de sortie.
+
+    Paramètres
+    ----------
+    dossier_sortie : str
+        Chemin du dossier qui contient les fichiers PDF
+    manifeste : dict
+        Nom du PDF -> empreinte des fiches présentes sur disque
+    """
+    with open(os.path.join(dossier_sortie, NOM_MANIFESTE), "w", encoding="utf-8") as fichier:
+        json.dump(manifeste, fichier, indent=1, sort_keys=True)
+
+
+def traiter_eleves(eleves, dossier_sortie, titre_feuille, nombre_processus=1,
+                   zip_seulement=False, forcer=False, profil=None, nombre_eleves=None,
+                   executeur=None, memoire=None, compression=COMPRESSION_ZIP):
+    """
+    Traiter tous les élèves de la liste
+
+    Les élèves sont traités au fur et à mesure qu'ils sont reçus : chaque PDF est
+    ajouté à l'archive dès qu'il est prêt et seules les lignes du sommaire sont
+    conservées.
+
+    Seuls les élèves dont la fiche a changé depuis la dernière exécution, selon le
+    manifeste du dossier de sortie, ou dont le PDF est absent sont générés.
+    Les autres PDF sont repris tels quels dans l'archive, depuis la mémoire s'ils y
+    sont (mode --watch), sinon depuis le disque.
+
+    Les PDF générés sont compressés par les processus de travail et ajoutés à
+    l'archive sans être compressés à nouveau.
+
+    Paramètres
+    ----------
+    eleves : iterable
+        Les élèves à traiter, une liste ou un générateur comme iterer_eleves
+
+    dossier_sortie : str
+        Chemin du dossier qui recevra les fichiers PDF
+
+    titre_feuille : str
         Le titre de la feuille Excel qui contient les rétroactions à traiter pour l'élève.
+
+    nombre_processus : int
+        Le nombre de processus qui génèrent les PDF en parallèle.
+
+    zip_seulement : bool
+        True pour n'écrire que l'archive zip, sans les PDF individuels.
+
+    forcer : bool
+        True pour générer tous les PDF, sans tenir compte du manifeste.
+
+    profil : Profil
+        Le profil qui reçoit la durée de création de chaque PDF, s'il y a lieu.
+
+    nombre_eleves : int
+        Le nombre d'élèves à afficher, nécessaire si eleves est un générateur.
+
+    executeur : ProcessPoolExecutor
+        Les processus de travail à réutiliser, déjà démarrés (mode lot). Sinon, ils
+        sont créés au besoin et arrêtés à la fin du traitement.
+
+    memoire : dict
+        Nom du PDF -> (empreinte, membre compressé) des fiches de l'exécution
+        précédente, mis à jour au fil du traitement (mode --watch).
+
+    compression : tuple
+        La méthode et le niveau de compression des membres de l'archive.
+
+    Retour
+    ------
+    Les lignes du sommaire des notes (voir ligne_sommaire), dans l'ordre des élèves.
     """
+    if profil is None:
+        profil = Profil()
+    if nombre_eleves is None:
+        nombre_eleves = len(eleves)
+    ecrire_pdf = not zip_seulement
+    manifeste = {} if forcer else lire_manifeste(dossier_sortie)
+    lignes = []
+    reutilises = 0
+
+    # Élèves reçus mais pas encore envoyés aux processus, puis élèves envoyés
+    # dont le PDF reste à ajouter à l'archive, dans l'ordre des élèves
+    lot = []
+    en_attente = deque()
+    taille_lot = TAILLE_LOT if nombre_processus > 1 else 1
+    limite_en_attente = taille_lot * nombre_processus * 2 if nombre_processus > 1 else 0
+    executeur_partage = executeur is not None
+
+    def envoyer_lot():
+        nonlocal executeur
+        a_generer = [eleve for eleve, _, a_jour in lot if not a_jour]
+        if not a_generer:
+            resultats = None
+        elif nombre_processus > 1:
+            if executeur is None:
+                executeur = ProcessPoolExecutor(max_workers=nombre_processus)
+            resultats = executeur.submit(traiter_lot_processus, dossier_sortie, a_generer,
+                                         titre_feuille, ecrire_pdf, compression)
+        else:
+            resultats = [(*traiter_eleve_chronometre(dossier_sortie, eleve, titre_feuille,
+                                                     ecrire_pdf, compression), "")
+                         for eleve in a_generer]
+        index = 0
+        for eleve, empreinte, a_jour in lot:
+            en_attente.append((eleve, empreinte, None if a_jour else (resultats, index)))
+            index += 0 if a_jour else 1
+        lot.clear()
+
+    def en_memoire(eleve, empreinte):
+        if forcer or memoire is None or memoire.get(eleve.nom_pdf(), (None,))[0] != empreinte:
+            return False
+        return not ecrire_pdf or os.path.isfile(os.path.join(dossier_sortie, eleve.nom_pdf()))
+
+    def archiver(fichier_zip, eleve, empreinte, resultat):
+        nonlocal reutilises
+        lignes.append(ligne_sommaire(eleve))
+        if resultat is None:
+            reutilises += 1
+            debut = time.perf_counter()
+            if en_memoire(eleve, empreinte):
+                ajouter_membre(fichier_zip, eleve.nom_pdf(), memoire[eleve.nom_pdf()][1],
+                               compression[0])
+            else:
+                fichier_zip.write(os.path.join(dossier_sortie, eleve.nom_pdf()), eleve.nom_pdf())
+            profil.cumuler("écriture zip", time.perf_counter() - debut)
+            return
+
+        resultats, index = resultat
+        if isinstance(resultats, Future):
+            resultats = resultats.result()
+        membre, (duree_rendu, duree_ecriture, duree_compression), sortie = resultats[index]
+        print(sortie, end="")
+        profil.ajouter_eleve(eleve.numero_da, duree_rendu + duree_ecriture + duree_compression)
+        # Durées additionnées sur tous les processus de travail : avec -j, elles
+        # peuvent dépasser la durée réelle de traiter_eleves
+        profil.cumuler("rendu PDF (cumul)", duree_rendu)
+        profil.cumuler("écriture PDF (cumul)", duree_ecriture)
+        profil.cumuler("compression (cumul)", duree_compression)
+        if membre is not None:
+            debut = time.perf_counter()
+            ajouter_membre(fichier_zip, eleve.nom_pdf(), membre, compression[0])
+            profil.cumuler("écriture zip", time.perf_counter() - debut)
+
+        # Le manifeste ne décrit que les PDF présents sur disque
+        if membre is not None and ecrire_pdf:
+            manifeste[eleve.nom_pdf()] = empreinte
+        else:
+            manifeste.pop(eleve.nom_pdf(), None)
+        if memoire is not None:
+            if membre is not None:
+                memoire[eleve.nom_pdf()] = (empreinte, membre)
+            else:
+                memoire.pop(eleve.nom_pdf(), None)
+
     # Créer le fichier ZIP
     nom_zip = os.path.join(dossier_sortie, "travaux.zip")
-    with ZipFile(nom_zip, "w") as fichier_zip:
-        # Traiter chaque étudiant
-        print(f"Création des fiches de rétroaction pour {len(eleves)} élève(s)")
-        for eleve in eleves:
-            fichier_zip.write(
-                traiter_eleve(dossier_sortie, eleve, titre_feuille),
-                    eleve.nom_pdf()
-                    )
+    try:
+        # Seuls les PDF repris du disque sont compressés par ZipFile
+        with ZipFile(nom_zip, "w", compression=compression[0],
+                     compresslevel=compression[1]) as fichier_zip:
+            # Traiter chaque étudiant
+            print(f"Création des fiches de rétroaction pour {nombre_eleves} élève(s)")
+            for eleve in eleves:
+                # Déterminer si la fiche est encore à jour sur disque
+                empreinte = eleve.empreinte(titre_feuille)
+                a_jour = ((manifeste.get(eleve.nom_pdf()) == empreinte and
+                           os.path.isfile(os.path.join(dossier_sortie, eleve.nom_pdf()))) or
+                          en_memoire(eleve, empreinte))
+                lot.append((eleve, empreinte, a_jour))
+                if len(lot) >= taille_lot:
+                    envoyer_lot()
+                while len(en_attente) > limite_en_attente:
+                    archiver(fichier_zip, *en_attente.popleft())
+
+            envoyer_lot()
+            while en_attente:
+                archiver(fichier_zip, *en_attente.popleft())
+
+            fichier_zip.close()
+    finally:
+        if executeur is not None and not executeur_partage:
+            executeur.shutdown(cancel_futures=True)
+
+    ecrire_manifeste(dossier_sortie, manifeste)
+
+    if reutilises:
+        print(f"{reutilises} fiche(s) inchangée(s) réutilisée(s)")
+
+    return lignes
+
+
+def valider_feuille(feuille, denominateur=None, traitement_partiel=False):
+    """
+        Vérifie qu'une feuille lue par lire_feuille contient les critères nécessaires,
+        une seule fois chacun, puis les valeurs de chaque élève (voir valider_eleves).
+
+        Paramètres
+        ----------
+        feuille : list
+            La feuille sous forme de liste de lignes
+        denominateur : int
+            Le dénominateur de la note totale, None pour ne pas valider les élèves
+        traitement_partiel : bool
+            True pour ne valider que les élèves sélectionnés
+
+        Retour
+        ------
+        Les lignes des critères et la liste des messages d'erreur, vide si la feuille est valide.
+    """
+    erreurs = []
+
+    # Valider si les critères de base sont présents, une seule fois
+    index = indexer_libelles(feuille)
+    criteres = trouver_lignes_criteres(feuille, index)
+
+    for cle, valeur in criteres.items():
+        if valeur == 0:
+            erreurs.append(f"Le critère {cle} n'existe pas dans le chiffrier.")
 
-        fichier_zip.close()
+    for cle, lignes in trouver_libelles_doubles(index).items():
+        erreurs.append(f"Le critère {cle} est présent plus d'une fois dans le chiffrier "
+                       f"(lignes {', '.join(str(ligne) for ligne in lignes)}).")
 
+    if denominateur is not None and not erreurs:
+        erreurs.extend(valider_eleves(feuille, criteres, denominateur, traitement_partiel))
 
-def valider_parametres(fichier_retroaction, dossier_sortie, nom_feuille_a_traiter, denominateur):
+    return criteres, erreurs
+
+
+def valider_eleves(feuille, criteres, denominateur, traitement_partiel=False):
+    """
+        Vérifie les valeurs de chaque élève à traiter avant la création des fiches :
+        DA présent et unique, note numérique entre zéro et le dénominateur.
+
+        Paramètres
+        ----------
+        feuille : list
+            La feuille lue par lire_feuille
+        criteres : dict
+            Les lignes des critères trouvées par trouver_lignes_criteres
+        denominateur : int
+            Le dénominateur de la note totale
+        traitement_partiel : bool
+            True pour ne valider que les élèves sélectionnés
+
+        Retour
+        ------
+        La liste des messages d'erreur, vide si tous les élèves sont valides.
+    """
+    erreurs = []
+    colonnes_da = {}
+
+    def valeur(ligne, colonne):
+        return feuille[ligne - 1][colonne - 1]
+
+    nombre_colonnes = len(feuille[0]) if feuille else 0
+    for etudiant in range(2, nombre_colonnes + 1):
+        if (traitement_partiel and
+            valeur(criteres[LIBELLE_SELECTION], etudiant) != "X"):
+            continue
+        colonne = get_column_letter(etudiant)
+
+        numero_da = valeur(criteres[LIBELLE_DA], etudiant)
+        if numero_da is None:
+            erreurs.append(f"Le {LIBELLE_DA} de l'élève de la colonne {colonne} est vide.")
+        else:
+            colonnes_da.setdefault(str(numero_da), []).append(colonne)
+
+        # Même conversion que iterer_eleves
+        note = valeur(criteres[LIBELLE_NOTES], etudiant)
+        try:
+            note = int(note)
+        except (TypeError, ValueError):
+            erreurs.append(f"La note de l'élève de la colonne {colonne} n'est pas un nombre : "
+                           f"{'vide' if note is None else note}.")
+            continue
+        if not 0 <= note <= denominateur:
+            erreurs.append(f"La note de l'élève de la colonne {colonne} ({note}) doit être "
+                           f"entre 0 et {denominateur}.")
+
+    for numero_da, colonnes in colonnes_da.items():
+        if len(colonnes) > 1:
+            erreurs.append(f"Le {LIBELLE_DA} {numero_da} est présent plus d'une fois "
+                           f"(colonnes {', '.join(colonnes)}).")
+
+    return erreurs
+
+
+def valider_parametres(fichier_retroaction, dossier_sortie, nom_feuille_a_traiter, denominateur,
+                       nombre_processus=1, traitement_partiel=False):
     """
         Valide l'ensemble des paramètres reçus en ligne de commande.
-        Vérifie que le chiffrier contient bien les critères nécessaires.
+        Vérifie que le chiffrier contient bien les critères nécessaires et que
+        les valeurs de chaque élève sont valides. Tous les problèmes sont
+        affichés avant la création de la première fiche.
 
         Paramètres
         ----------
@@ -546,10 +1908,15 @@ def valider_parametres(fichier_retroaction, dossier_sortie, nom_feuille_a_traite
             Le nom de la feuille Excel qui contient les rétroactions à traiter pour l'élève.
         denominateur : int
             Le dénominateur de la note totale
+        nombre_processus : int
+            Le nombre de processus qui génèrent les PDF en parallèle.
+        traitement_partiel : bool
+            True pour ne valider que les élèves sélectionnés.
 
         Retour
         ------
-        True si tout est valide.
+        La feuille lue par lire_feuille et les lignes de ses critères
+        si tout est valide, None sinon.
     """
 
     parametres_valides = True
@@ -560,26 +1927,146 @@ def valider_parametres(fichier_retroaction, dossier_sortie, nom_feuille_a_traite
         parametres_valides = False
 
     # Vérifier si le fichier d'entrée est un chiffrier Excel
+    feuille = None
+    criteres = None
     try:
-        chiffrier = openpyxl.load_workbook(fichier_retroaction, data_only=True)
-
-        # Vérifier si la feuille existe
-        if nom_feuille_a_traiter not in chiffrier:
-            print(f"La feuille {nom_feuille_a_traiter} n'existe pas.")
-            parametres_valides = False
+        if os.path.isfile(fichier_retroaction):
+            feuille = lire_feuille(fichier_retroaction, nom_feuille_a_traiter)
+            criteres, erreurs = valider_feuille(feuille, denominateur if denominateur > 0 else None,
+                                                traitement_partiel)
         else:
+            erreurs = []
+        for erreur in erreurs:
+            print(erreur)
+            parametres_valides = False
+    except KeyError:
+        print(f"La feuille {nom_feuille_a_traiter} n'existe pas.")
+        parametres_valides = False
+    except (BadZipFile, csv.Error):
+        print(f"Le fichier d'entrée {fichier_retroaction} n'est pas un chiffrier Excel valide.")
+        parametres_valides = False
 
-            # Valider si les critères de base sont présents
-            criteres = trouver_lignes_criteres(chiffrier[nom_feuille_a_traiter])
+    if not os.path.isdir(dossier_sortie):
+        print(f"Le dossier de sortie {dossier_sortie} n'existe pas.")
+        parametres_valides = False
 
-            for cle, valeur in criteres.items():
-                if valeur == 0:
-                    print(f"Le critère {cle} n'existe pas dans le chiffrier.")
-                    parametres_valides = False
+    if denominateur < 1:
+        print("Le dénominateur doit être plus grand que zéro.")
+        parametres_valides = False
 
-        chiffrier.close()
-    except BadZipFile:
-        print(f"Le fichier d'entrée {fichier_retroaction} n'est pas un chiffrier Excel valide.")
+    if nombre_processus < 1:
+        print("Le nombre de processus doit être plus grand que zéro.")
+        parametres_valides = False
+
+    return (feuille, criteres) if parametres_valides else None
+
+def generer_retroactions(feuille, criteres, dossier_sortie, nom_feuille_a_traiter, titre_feuille,
+                         denominateur, traitement_partiel=False, nombre_processus=1,
+                         zip_seulement=False, forcer=False, profil=None, executeur=None,
+                         memoire=None, compression=COMPRESSION_ZIP, nom_sommaire=None):
+    """
+        Créer les fiches, l'archive zip et le sommaire des notes d'une feuille validée.
+
+        Paramètres
+        ----------
+        feuille : list
+            La feuille lue par lire_feuille
+        criteres : dict
+            Les lignes des critères trouvées à la validation
+        dossier_sortie : str
+            Chemin du dossier qui recevra les PDF, travaux.zip et le sommaire
+        nom_feuille_a_traiter : str
+            Le nom de la feuille, qui nomme le chiffrier du sommaire
+        titre_feuille : str
+            Titre des fiches générées
+        denominateur : int
+            Le dénominateur de la note totale
+        traitement_partiel : bool
+            True pour ne traiter que les élèves sélectionnés
+        nombre_processus : int
+            Le nombre de processus qui génèrent les PDF en parallèle.
+        zip_seulement : bool
+            True pour n'écrire que l'archive zip, sans les PDF individuels.
+        forcer : bool
+            True pour générer tous les PDF, sans tenir compte du manifeste.
+        profil : Profil
+            Le profil qui reçoit les mesures, s'il y a lieu.
+        executeur : ProcessPoolExecutor
+            Les processus de travail à réutiliser, s'il y a lieu.
+        memoire : dict
+            Les fiches gardées en mémoire entre deux exécutions (voir traiter_eleves).
+        compression : tuple
+            La méthode et le niveau de compression des membres de travaux.zip.
+        nom_sommaire : str
+            Le nom du chiffrier du sommaire, sans extension (le nom de la feuille par défaut).
+
+        Retour
+        ------
+        Le nombre d'élèves traités.
+    """
+    if profil is None:
+        profil = Profil()
+
+    # Chaque élève est traité dès qu'il est lu
+    nombre_eleves = compter_eleves(feuille, traitement_partiel, criteres)
+    eleves = iterer_eleves(feuille, denominateur, traitement_partiel, criteres)
+    with profil.mesurer("traiter_eleves"):
+        lignes = traiter_eleves(eleves, dossier_sortie, titre_feuille, nombre_processus,
+                                zip_seulement, forcer, profil, nombre_eleves, executeur,
+                                memoire, compression)
+    with profil.mesurer("sommaire_notes"):
+        ecrire_sommaire(lignes, dossier_sortie, denominateur,
+                        nom_feuille_a_traiter if nom_sommaire is None else nom_sommaire)
+    return nombre_eleves
+
+
+def lister_chiffriers(chemin_entree):
+    """
+        Lister les chiffriers à traiter en mode lot.
+
+        Paramètres
+        ----------
+        chemin_entree : str
+            Un chiffrier Excel ou un dossier qui en contient
+
+        Retour
+        ------
+        La liste triée des chemins des chiffriers.
+    """
+    if os.path.isfile(chemin_entree):
+        return [chemin_entree]
+    # Les fichiers ~$... sont les verrous d'Excel pendant l'édition
+    return [os.path.join(chemin_entree, nom) for nom in sorted(os.listdir(chemin_entree))
+            if nom.lower().endswith(EXTENSIONS_CHIFFRIERS) and not nom.startswith('~$')]
+
+
+def valider_parametres_lot(chemin_entree, dossier_sortie, denominateur, nombre_processus=1):
+    """
+        Valide les paramètres reçus en ligne de commande pour le mode lot.
+        Les feuilles sont validées une à une pendant le traitement.
+
+        Paramètres
+        ----------
+        chemin_entree : str
+            Un chiffrier Excel ou un dossier qui en contient
+        dossier_sortie : str
+            Chemin sur disque du dossier qui recevra un sous-dossier par feuille
+        denominateur : int
+            Le dénominateur de la note totale
+        nombre_processus : int
+            Le nombre de processus qui génèrent les PDF en parallèle.
+
+        Retour
+        ------
+        True si tout est valide, False sinon.
+    """
+    parametres_valides = True
+
+    if not os.path.exists(chemin_entree):
+        print(f"Le fichier ou dossier d'entrée {chemin_entree} n'existe pas.")
+        parametres_valides = False
+    elif not lister_chiffriers(chemin_entree):
+        print(f"Le dossier d'entrée {chemin_entree} ne contient aucun chiffrier Excel.")
         parametres_valides = False
 
     if not os.path.isdir(dossier_sortie):
@@ -590,8 +2077,539 @@ def valider_parametres(fichier_retroaction, dossier_sortie, nom_feuille_a_traite
         print("Le dénominateur doit être plus grand que zéro.")
         parametres_valides = False
 
+    if nombre_processus < 1:
+        print("Le nombre de processus doit être plus grand que zéro.")
+        parametres_valides = False
+
     return parametres_valides
 
+
+def traiter_en_lot(chemin_entree, dossier_sortie, motif_feuille, titre_feuille, denominateur,
+                   traitement_partiel=False, nombre_processus=1, zip_seulement=False,
+                   forcer=False, profiler=False, compression=COMPRESSION_ZIP):
+    """
+        Traiter toutes les feuilles d'un chiffrier, ou de tous les chiffriers d'un dossier.
+
+        Chaque chiffrier n'est ouvert qu'une fois et les processus de travail, avec
+        leurs polices déjà chargées, servent à toutes les feuilles. Chaque feuille
+        reçoit son sous-dossier, <dossier_sortie>/<feuille> pour un chiffrier ou
+        <dossier_sortie>/<chiffrier>/<feuille> pour un dossier, avec ses PDF, son
+        archive zip et son sommaire. Les feuilles sans les critères nécessaires
+        sont ignorées.
+
+        Paramètres
+        ----------
+        chemin_entree : str
+            Un chiffrier Excel ou un dossier qui en contient
+        dossier_sortie : str
+            Chemin du dossier qui recevra un sous-dossier par feuille
+        motif_feuille : str
+            Motif (fnmatch) des noms de feuilles à traiter
+        titre_feuille : str
+            Titre des fiches générées, le nom de chaque feuille s'il est vide
+        denominateur : int
+            Le dénominateur de la note totale
+        traitement_partiel : bool
+            True pour ne traiter que les élèves sélectionnés
+        nombre_processus : int
+            Le nombre de processus qui génèrent les PDF en parallèle.
+        zip_seulement : bool
+            True pour n'écrire que l'archive zip, sans les PDF individuels.
+        forcer : bool
+            True pour générer tous les PDF, sans tenir compte du manifeste.
+        profiler : bool
+            True pour écrire un profil.json dans le sous-dossier de chaque feuille.
+        compression : tuple
+            La méthode et le niveau de compression des membres de travaux.zip.
+
+        Retour
+        ------
+        Le nombre de feuilles traitées.
+    """
+    par_chiffrier = os.path.isdir(chemin_entree)
+    nombre_feuilles = 0
+    nombre_eleves = 0
+    executeur = ProcessPoolExecutor(max_workers=nombre_processus) if nombre_processus > 1 else None
+    try:
+        for fichier_retroaction in lister_chiffriers(chemin_entree):
+            print(f'Chiffrier : "{fichier_retroaction}"')
+            try:
+                feuilles = iterer_feuilles(fichier_retroaction, motif_feuille)
+                for nom_feuille, feuille in feuilles:
+                    criteres, erreurs = valider_feuille(feuille, denominateur,
+                                                        traitement_partiel)
+                    if not any(criteres.values()):
+                        print(f'Feuille "{nom_feuille}" ignorée : aucun critère de rétroaction.')
+                        continue
+                    if erreurs:
+                        print(f'Feuille "{nom_feuille}" ignorée :')
+                        for erreur in erreurs:
+                            print(f"    {erreur}")
+                        continue
+
+                    dossier_feuille = dossier_sortie
+                    if par_chiffrier:
+                        dossier_feuille = os.path.join(dossier_feuille,
+                                                       Path(fichier_retroaction).stem)
+                    dossier_feuille = os.path.join(dossier_feuille, nom_feuille)
+                    os.makedirs(dossier_feuille, exist_ok=True)
+                    print(f'Feuille "{nom_feuille}" -> "{dossier_feuille}"')
+
+                    profil = Profil(profiler)
+                    nombre = generer_retroactions(feuille, criteres, dossier_feuille, nom_feuille,
+                                                  titre_feuille or nom_feuille, denominateur,
+                                                  traitement_partiel, nombre_processus,
+                                                  zip_seulement, forcer, profil, executeur,
+                                                  compression=compression)
+                    if profiler:
+                        profil.afficher()
+                        profil.ecrire(dossier_feuille, {
+                            "fichier" : fichier_retroaction,
+                            "feuille" : nom_feuille,
+                            "nombre_eleves" : nombre,
+                            "nombre_processus" : nombre_processus,
+                            })
+                    nombre_feuilles += 1
+                    nombre_eleves += nombre
+            except (BadZipFile, csv.Error):
+                print(f"Le fichier d'entrée {fichier_retroaction} n'est pas un chiffrier Excel valide.")
+    finally:
+        if executeur is not None:
+            executeur.shutdown(cancel_futures=True)
+
+    print(f"{nombre_feuilles} feuille(s) traitée(s), {nombre_eleves} élève(s)")
+    return nombre_feuilles
+
+
+def signature_fichier(fichier):
+    """
+        Renvoyer la date de modification et la taille d'un fichier, None s'il est absent
+        (par exemple pendant qu'Excel le remplace à l'enregistrement).
+
+        Paramètres
+        ----------
+        fichier : str
+            Chemin du fichier surveillé
+    """
+    try:
+        etat = os.stat(fichier)
+    except OSError:
+        return None
+    return etat.st_mtime_ns, etat.st_size
+
+
+def surveiller(fichier_retroaction, dossier_sortie, nom_feuille_a_traiter, titre_feuille,
+               denominateur, traitement_partiel=False, nombre_processus=1, zip_seulement=False,
+               forcer=False, compression=COMPRESSION_ZIP):
+    """
+        Générer les fiches, puis les générer à nouveau à chaque enregistrement du chiffrier.
+
+        Le processus reste actif avec ses polices et ses processus de travail chargés.
+        Le chiffrier est surveillé par sa date de modification et sa taille et les
+        fiches de la dernière exécution sont gardées en mémoire : seuls les élèves
+        dont la fiche a changé sont générés à nouveau. Ctrl+C termine la surveillance.
+
+        Paramètres
+        ----------
+        fichier_retroaction : str
+            Nom et chemin du chiffrier Excel contenant les rétroactions
+        dossier_sortie : str
+            Chemin du dossier qui recevra les PDF, travaux.zip et le sommaire
+        nom_feuille_a_traiter : str
+            Le nom de la feuille Excel qui contient les rétroactions
+        titre_feuille : str
+            Titre des fiches générées
+        denominateur : int
+            Le dénominateur de la note totale
+        traitement_partiel : bool
+            True pour ne traiter que les élèves sélectionnés
+        nombre_processus : int
+            Le nombre de processus qui génèrent les PDF en parallèle.
+        zip_seulement : bool
+            True pour n'écrire que l'archive zip, sans les PDF individuels.
+        forcer : bool
+            True pour générer tous les PDF à la première exécution.
+        compression : tuple
+            La méthode et le niveau de compression des membres de travaux.zip.
+    """
+    memoire = {}
+    signature = None
+    executeur = ProcessPoolExecutor(max_workers=nombre_processus) if nombre_processus > 1 else None
+    try:
+        while True:
+            nouvelle_signature = signature_fichier(fichier_retroaction)
+            if nouvelle_signature is not None and nouvelle_signature != signature:
+                # Attendre que l'enregistrement soit terminé avant de lire
+                time.sleep(INTERVALLE_SURVEILLANCE)
+                if signature_fichier(fichier_retroaction) != nouvelle_signature:
+                    continue
+                signature = nouvelle_signature
+
+                debut = time.perf_counter()
+                lecture = valider_parametres(fichier_retroaction, dossier_sortie,
+                                             nom_feuille_a_traiter, denominateur,
+                                             nombre_processus, traitement_partiel)
+                if lecture is not None:
+                    feuille, criteres = lecture
+                    generer_retroactions(feuille, criteres, dossier_sortie,
+                                         nom_feuille_a_traiter, titre_feuille, denominateur,
+                                         traitement_partiel, nombre_processus, zip_seulement,
+                                         forcer, executeur=executeur, memoire=memoire,
+                                         compression=compression)
+                    print(f"Rétroaction à jour en {time.perf_counter() - debut:.2f} s")
+                forcer = False
+                print(f'En attente d\'un enregistrement de "{fichier_retroaction}" '
+                      "(Ctrl+C pour quitter)")
+            time.sleep(INTERVALLE_SURVEILLANCE)
+    except KeyboardInterrupt:
+        print("Fin de la surveillance")
+    finally:
+        if executeur is not None:
+            executeur.shutdown(cancel_futures=True)
+
+
+def precharger_polices():
+    """
+        Charger les polices dans le cache du processus courant, avant le premier élève.
+    """
+    FeuilleEvaluation("")
+
+
+class Metriques:
+    """
+        Latence et décompte des requêtes du service HTTP (option --serve)
+    """
+    def __init__(self):
+        """
+            Initialiser les métriques.
+        """
+        self.verrou = threading.Lock()
+        self.latences = deque(maxlen=NOMBRE_LATENCES)
+        self.requetes = 0
+        self.erreurs = 0
+        self.refusees = 0
+        self.en_cours = 0
+
+    def debuter(self):
+        """
+            Noter le début d'un traitement.
+        """
+        with self.verrou:
+            self.en_cours += 1
+
+    def terminer(self, duree, succes):
+        """
+            Noter la fin d'un traitement.
+
+            Paramètres
+            ----------
+            duree : float
+                Durée de la requête, en secondes
+            succes : bool
+                False si la requête s'est terminée par une erreur
+        """
+        with self.verrou:
+            self.en_cours -= 1
+            self.requetes += 1
+            self.erreurs += 0 if succes else 1
+            self.latences.append(duree)
+
+    def refuser(self):
+        """
+            Noter une requête refusée parce que trop de traitements sont en cours.
+        """
+        with self.verrou:
+            self.refusees += 1
+
+    def resume(self):
+        """
+            Renvoyer les métriques sous forme de dictionnaire, latences en secondes
+            sur les NOMBRE_LATENCES dernières requêtes.
+        """
+        with self.verrou:
+            latences = sorted(self.latences)
+            resume = {
+                "requetes" : self.requetes,
+                "erreurs" : self.erreurs,
+                "refusees" : self.refusees,
+                "en_cours" : self.en_cours,
+                }
+
+        def centile(proportion):
+            return latences[round(proportion * (len(latences) - 1))] if latences else None
+
+        resume["latence_s"] = {
+            "moyenne" : statistics.fmean(latences) if latences else None,
+            "p50" : centile(0.5),
+            "p95" : centile(0.95),
+            "max" : latences[-1] if latences else None,
+            }
+        return resume
+
+
+class RequeteRetroaction(BaseHTTPRequestHandler):
+    """
+        Requêtes du service HTTP :
+
+        POST /retroaction?feuille=<nom>&denominateur=<n>[&titre=<titre>][&partiel=1][&format=csv]
+            Le corps est le chiffrier Excel, ou CSV avec format=csv. La réponse est une archive zip qui
+            contient travaux.zip et le sommaire <feuille>.xlsx.
+        GET /metriques
+            Les métriques du service en JSON.
+    """
+    def repondre(self, code, corps, type_contenu="text/plain; charset=utf-8"):
+        """
+            Envoyer une réponse complète.
+
+            Paramètres
+            ----------
+            code : int
+                Code HTTP de la réponse
+            corps : str ou bytes
+                Contenu de la réponse
+            type_contenu : str
+                Type MIME du contenu
+        """
+        if isinstance(corps, str):
+            corps = corps.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", type_contenu)
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def do_GET(self): # pylint: disable=invalid-name
+        """
+            Renvoyer les métriques du service.
+        """
+        if urlsplit(self.path).path != "/metriques":
+            self.repondre(404, "Ressource inconnue.\n")
+            return
+        self.repondre(200, json.dumps(self.server.metriques.resume(), indent=1),
+                      "application/json")
+
+    def do_POST(self): # pylint: disable=invalid-name
+        """
+            Générer les fiches d'un chiffrier reçu, si le nombre de traitements le permet.
+        """
+        if urlsplit(self.path).path != "/retroaction":
+            self.repondre(404, "Ressource inconnue.\n")
+            return
+        if not self.server.travaux.acquire(blocking=False):
+            self.server.metriques.refuser()
+            self.send_response(503)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        metriques = self.server.metriques
+        metriques.debuter()
+        debut = time.perf_counter()
+        code = 500
+        corps = "Erreur interne pendant le traitement du chiffrier.\n"
+        try:
+            code, corps = self.traiter_chiffrier()
+        except Exception: # pylint: disable=broad-except
+            # Une erreur imprévue ne doit pas laisser le client sans réponse
+            self.log_error("Erreur pendant le traitement de %s", self.path)
+            traceback.print_exc()
+        finally:
+            # Le traitement est terminé : la place se libère avant l'envoi de la réponse
+            self.server.travaux.release()
+            metriques.terminer(time.perf_counter() - debut, code == 200)
+
+        try:
+            if code == 200:
+                self.envoyer_archive(corps)
+            else:
+                self.repondre(code, corps)
+        except OSError:
+            # Le client est déjà déconnecté
+            pass
+        finally:
+            if code == 200:
+                corps.close()
+
+    def envoyer_archive(self, archive):
+        """
+            Envoyer l'archive des fiches.
+
+            Paramètres
+            ----------
+            archive : fichier
+                L'archive retroaction.zip, ouverte en lecture binaire
+        """
+        archive.seek(0, os.SEEK_END)
+        taille = archive.tell()
+        archive.seek(0)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(taille))
+        self.send_header("Content-Disposition", 'attachment; filename="retroaction.zip"')
+        self.end_headers()
+        shutil.copyfileobj(archive, self.wfile)
+
+    def traiter_chiffrier(self):
+        """
+            Lire le chiffrier reçu et générer les fiches, sans envoyer la réponse.
+
+            Retour
+            ------
+            Le tuple (code HTTP, corps) : l'archive retroaction.zip dans un fichier
+            temporaire anonyme si le code est 200, le message d'erreur sinon.
+        """
+        parametres = parse_qs(urlsplit(self.path).query)
+        nom_feuille = parametres.get("feuille", [""])[0]
+        format_chiffrier = parametres.get("format", ["xlsx"])[0]
+        titre_feuille = parametres.get("titre", [""])[0]
+        traitement_partiel = parametres.get("partiel", ["0"])[0] not in ("", "0")
+        try:
+            denominateur = int(parametres.get("denominateur", ["0"])[0])
+        except ValueError:
+            denominateur = 0
+        try:
+            taille = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            return 411, "La longueur du chiffrier est requise.\n"
+
+        erreurs = []
+        if not nom_feuille:
+            erreurs.append("Le paramètre feuille est requis.")
+        elif any(caractere in nom_feuille for caractere in ("/", "\\", "\0")) or ".." in nom_feuille:
+            erreurs.append("Le paramètre feuille ne peut contenir /, \\, .. ni de caractère nul.")
+        if denominateur < 1:
+            erreurs.append("Le dénominateur doit être plus grand que zéro.")
+        if f".{format_chiffrier}" not in EXTENSIONS_CHIFFRIERS:
+            erreurs.append(f"Le format doit être {', '.join(e[1:] for e in EXTENSIONS_CHIFFRIERS)}.")
+            format_chiffrier = "xlsx"
+        if taille > TAILLE_MAX_CHIFFRIER:
+            return 413, "Le chiffrier est trop volumineux.\n"
+
+        with tempfile.TemporaryDirectory() as dossier:
+            fichier_retroaction = os.path.join(dossier, f"chiffrier.{format_chiffrier}")
+            with open(fichier_retroaction, "wb") as fichier:
+                reste = taille
+                while reste > 0:
+                    morceau = self.rfile.read(min(reste, 64 * 1024))
+                    if not morceau:
+                        break
+                    fichier.write(morceau)
+                    reste -= len(morceau)
+            if erreurs:
+                return 400, "\n".join(erreurs) + "\n"
+
+            try:
+                feuille = lire_feuille(fichier_retroaction, nom_feuille)
+            except KeyError:
+                erreurs.append(f"La feuille {nom_feuille} n'existe pas.")
+            except (BadZipFile, csv.Error):
+                erreurs.append("Le fichier reçu n'est pas un chiffrier Excel valide.")
+            else:
+                criteres, erreurs = valider_feuille(feuille, denominateur, traitement_partiel)
+            if erreurs:
+                return 400, "\n".join(erreurs) + "\n"
+
+            dossier_sortie = os.path.join(dossier, "sortie")
+            os.mkdir(dossier_sortie)
+            generer_retroactions(feuille, criteres, dossier_sortie, nom_feuille, titre_feuille,
+                                 denominateur, traitement_partiel, self.server.nombre_processus,
+                                 zip_seulement=True, forcer=True,
+                                 executeur=self.server.executeur,
+                                 compression=self.server.compression,
+                                 nom_sommaire="sommaire")
+
+            # L'archive survit au dossier temporaire, le temps d'être envoyée.
+            # Le nom de la feuille ne sert qu'à nommer le membre de l'archive.
+            archive = tempfile.TemporaryFile()
+            try:
+                with ZipFile(archive, "w") as reponse:
+                    reponse.write(os.path.join(dossier_sortie, "travaux.zip"), "travaux.zip")
+                    reponse.write(os.path.join(dossier_sortie, "sommaire.xlsx"),
+                                  f"{nom_feuille}.xlsx")
+            except BaseException:
+                archive.close()
+                raise
+        return 200, archive
+
+
+class ServiceRetroaction(ThreadingHTTPServer):
+    """
+        Service HTTP local qui génère les fiches de rétroaction (option --serve)
+
+        Les polices sont chargées au démarrage dans chaque processus et les processus
+        de travail servent à toutes les requêtes.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=PORT_SERVICE, nombre_processus=1,
+                 nombre_travaux=NOMBRE_TRAVAUX_SIMULTANES, compression=COMPRESSION_ZIP):
+        """
+            Démarrer le service sur HOTE_SERVICE seulement.
+
+            Paramètres
+            ----------
+            port : int
+                Le port d'écoute, 0 pour un port libre choisi par le système
+            nombre_processus : int
+                Le nombre de processus qui génèrent les PDF en parallèle
+            nombre_travaux : int
+                Le nombre de chiffriers traités en même temps ; les autres
+                requêtes sont refusées (503)
+            compression : tuple
+                La méthode et le niveau de compression des membres de travaux.zip
+        """
+        super().__init__((HOTE_SERVICE, port), RequeteRetroaction)
+        self.nombre_processus = nombre_processus
+        self.compression = compression
+        self.travaux = threading.BoundedSemaphore(nombre_travaux)
+        self.metriques = Metriques()
+
+        precharger_polices()
+        self.executeur = None
+        if nombre_processus > 1:
+            self.executeur = ProcessPoolExecutor(max_workers=nombre_processus,
+                                                 initializer=precharger_polices)
+            # Démarrer les processus de travail avant la première requête
+            for demarrage in [self.executeur.submit(int) for _ in range(nombre_processus)]:
+                demarrage.result()
+
+    def server_close(self):
+        """
+            Arrêter le service et ses processus de travail.
+        """
+        super().server_close()
+        if self.executeur is not None:
+            self.executeur.shutdown(cancel_futures=True)
+
+
+def servir(port=PORT_SERVICE, nombre_processus=1, nombre_travaux=NOMBRE_TRAVAUX_SIMULTANES,
+           compression=COMPRESSION_ZIP):
+    """
+        Exécuter le service HTTP local jusqu'à Ctrl+C.
+
+        Paramètres
+        ----------
+        port : int
+            Le port d'écoute
+        nombre_processus : int
+            Le nombre de processus qui génèrent les PDF en parallèle
+        nombre_travaux : int
+            Le nombre de chiffriers traités en même temps
+        compression : tuple
+            La méthode et le niveau de compression des membres de travaux.zip
+    """
+    service = ServiceRetroaction(port, nombre_processus, nombre_travaux, compression)
+    print(f"Service de rétroaction sur http://{HOTE_SERVICE}:{service.server_address[1]}"
+          " (Ctrl+C pour quitter)")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print("Arrêt du service")
+    finally:
+        service.server_close()
+
+
 def mode_interactif():
     """
         Mode interactif
@@ -599,8 +2617,8 @@ def mode_interactif():
     # Get a list of all files in the current directory
     files_in_directory = os.listdir('.')
 
-    # Filter only files with .xlsx or .xls extensions
-    fichiers_excel_dossier_courant = [file for file in files_in_directory if file.endswith(('.xlsx', '.xls'))]
+    # Filter only files with .xlsx, .xls or .csv extensions
+    fichiers_excel_dossier_courant = [file for file in files_in_directory if file.endswith(('.xlsx', '.xls', '.csv'))]
 
     print("Rétroaction à partir de quel fichier?" )
     print("")
@@ -612,16 +2630,16 @@ def mode_interactif():
     fichier_choisi = fichiers_excel_dossier_courant[choix_fichier]
     print(f'Fichier choisi : {fichier_choisi}')
 
-    chiffrier = openpyxl.load_workbook(fichier_choisi, data_only=True)
+    noms_feuilles = ouvrir_lecteur(fichier_choisi).noms_feuilles()
 
     print("Rétroaction à partir de quel feuille?" )
     print("")
-    for index, feuille in enumerate(chiffrier.worksheets):
-        print(f'{index} - {feuille}')
+    for index, nom_feuille in enumerate(noms_feuilles):
+        print(f'{index} - {nom_feuille}')
 
     choix_feuille = int(input("?"))
 
-    feuille_choisie = chiffrier.worksheets[choix_feuille].title
+    feuille_choisie = noms_feuilles[choix_feuille]
     print(f'Feuille choisie : {feuille_choisie}')
 
     print("Rétroaction dans quel dossier?" )
@@ -634,10 +2652,8 @@ def mode_interactif():
 
     denominateur = int(input("?"))
 
-    eleves = generer_liste_eleves(fichier_choisi, feuille_choisie,
-    denominateur, False)
-    traiter_eleves(eleves, dossier, feuille_choisie)
-    sommaire_notes(eleves, dossier, denominateur, feuille_choisie)
+    feuille = lire_feuille(fichier_choisi, feuille_choisie)
+    generer_retroactions(feuille, None, dossier, feuille_choisie, feuille_choisie, denominateur)
 
 
 
@@ -653,11 +2669,24 @@ def main(argv):
     denominateur = 0
     traitement_partiel = False
     titre_feuille = ""
+    nombre_processus = 1
+    zip_seulement = False
+    forcer = False
+    profiler = False
+    en_lot = False
+    surveillance = False
+    service = False
+    port = PORT_SERVICE
+    nombre_travaux = NOMBRE_TRAVAUX_SIMULTANES
+    methode_compression, niveau_compression = COMPRESSION_ZIP
 
     currentdir = os.getcwd()
 
     try:
-        opts, _ = getopt.getopt(argv,"phi:o:s:d:t:")
+        opts, _ = getopt.getopt(argv,"phi:o:s:d:t:j:zfb",
+                                ["jobs=", "zip-only", "force", "profile", "batch", "watch",
+                                 "serve", "port=", "max-concurrent=",
+                                 "compression=", "compression-level="])
     except getopt.GetoptError:
         affiche_aide()
         sys.exit(2)
@@ -680,8 +2709,74 @@ def main(argv):
             denominateur = int(arg)
         elif opt == '-p':
             traitement_partiel = True
+        elif opt in ('-j', '--jobs'):
+            nombre_processus = int(arg)
+        elif opt in ('-z', '--zip-only'):
+            zip_seulement = True
+        elif opt in ('-f', '--force'):
+            forcer = True
+        elif opt == '--profile':
+            profiler = True
+        elif opt in ('-b', '--batch'):
+            en_lot = True
+        elif opt == '--watch':
+            surveillance = True
+        elif opt == '--serve':
+            service = True
+        elif opt == '--port':
+            port = int(arg)
+        elif opt == '--max-concurrent':
+            nombre_travaux = int(arg)
+        elif opt == '--compression':
+            methode_compression = METHODES_COMPRESSION.get(arg)
+        elif opt == '--compression-level':
+            niveau_compression = int(arg)
+
+    if methode_compression is None:
+        print(f"La compression doit être {', '.join(METHODES_COMPRESSION)}.")
+        return
+    if methode_compression == ZIP_DEFLATED and not 0 <= niveau_compression <= 9:
+        print("Le niveau de compression deflated doit être entre 0 et 9.")
+        return
+    if methode_compression == ZIP_BZIP2 and not 1 <= niveau_compression <= 9:
+        print("Le niveau de compression bzip2 doit être entre 1 et 9.")
+        return
+    compression = (methode_compression, niveau_compression)
+
+    if service:
+        if nombre_processus < 1 or nombre_travaux < 1:
+            print("Le nombre de processus et de traitements simultanés doit être "
+                  "plus grand que zéro.")
+            return
+        servir(port, nombre_processus, nombre_travaux, compression)
+        return
+
+    if en_lot:
+        if valider_parametres_lot(fichier_retroaction, dossier_sortie, denominateur,
+                                  nombre_processus):
+            traiter_en_lot(fichier_retroaction, dossier_sortie, nom_feuille_a_traiter or "*",
+                           titre_feuille, denominateur, traitement_partiel, nombre_processus,
+                           zip_seulement, forcer, profiler, compression)
+        return
+
+    # Un fichier CSV n'a qu'une feuille : -s ne sert qu'à nommer le sommaire
+    if (not nom_feuille_a_traiter and os.path.isfile(fichier_retroaction) and
+            ouvrir_lecteur(fichier_retroaction).feuille_unique):
+        nom_feuille_a_traiter = ouvrir_lecteur(fichier_retroaction).noms_feuilles()[0]
+
+    if surveillance:
+        surveiller(fichier_retroaction, dossier_sortie, nom_feuille_a_traiter, titre_feuille,
+                   denominateur, traitement_partiel, nombre_processus, zip_seulement, forcer,
+                   compression)
+        return
 
-    if valider_parametres(fichier_retroaction, dossier_sortie, nom_feuille_a_traiter, denominateur):
+    profil = Profil(profiler)
+    with profil.mesurer("validation"):
+        lecture = valider_parametres(fichier_retroaction, dossier_sortie,
+                                     nom_feuille_a_traiter, denominateur, nombre_processus,
+                                     traitement_partiel)
+    if lecture is not None:
+        feuille, criteres = lecture
         print(f'Fichier d\'entrée est : "{fichier_retroaction}"')
         print(f'Dossier de sortie est : "{dossier_sortie}"')
         print(f'Nom de la feuille est "{nom_feuille_a_traiter}"')
@@ -690,10 +2785,20 @@ def main(argv):
         else:
             print("Traitement complet")
         print(f'La note est sur : {denominateur}')
-        eleves = generer_liste_eleves(fichier_retroaction, nom_feuille_a_traiter,
-            denominateur, traitement_partiel)
-        traiter_eleves(eleves, dossier_sortie, titre_feuille)
-        sommaire_notes(eleves, dossier_sortie, denominateur, nom_feuille_a_traiter)
+        nombre_eleves = generer_retroactions(feuille, criteres, dossier_sortie,
+                                             nom_feuille_a_traiter, titre_feuille, denominateur,
+                                             traitement_partiel, nombre_processus,
+                                             zip_seulement, forcer, profil,
+                                             compression=compression)
+
+        if profiler:
+            profil.afficher()
+            profil.ecrire(dossier_sortie, {
+                "fichier" : fichier_retroaction,
+                "feuille" : nom_feuille_a_traiter,
+                "nombre_eleves" : nombre_eleves,
+                "nombre_processus" : nombre_processus,
+                })
 
 
 if __name__ == "__main__":